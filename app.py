@@ -7,6 +7,17 @@ from src.pages.optimization_page import optimization_page
 from src.pages.calculator_page import manual_calculator_page
 from src.pages.collection_page import collection_page
 from src.ui.components import render_header
+from src.utils.constants import FOOTER_TEMPLATE
+
+
+@st.cache_data(show_spinner=False)
+def _style_block() -> str:
+    return f"<style>{Path('assets/styles.css').read_text()}</style>"
+
+
+@st.cache_data(show_spinner=False)
+def _readme() -> str:
+    return Path("README.md").read_text(encoding="utf-8")
 
 
 def main() -> None:
@@ -17,8 +28,7 @@ def main() -> None:
         initial_sidebar_state="expanded"
     )
 
-    css = Path("assets/styles.css").read_text()
-    st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
+    st.markdown(_style_block(), unsafe_allow_html=True)
 
     render_header()
 
@@ -53,17 +63,11 @@ def main() -> None:
     elif page == "Коллекция Лакея":
         collection_page()
     elif page == "О проекте":
-        readme = Path("README.md").read_text(encoding="utf-8")
-        st.markdown(readme, unsafe_allow_html=True)
+        st.markdown(_readme(), unsafe_allow_html=True)
     elif page == "Инструкция":
         render_help_page()
 
-    st.markdown(f"""
-    <hr class="site-footer-hr">
-    <div class="site-footer">
-      {h.get_random_footer_phrase()} — <b>hailSolus</b>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(FOOTER_TEMPLATE.format(phrase=h.get_random_footer_phrase()), unsafe_allow_html=True)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,9 @@
-import json
+import orjson
+import numpy as np
 import pandas as pd
+import streamlit as st
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Tuple
 
 from src.utils.helpers import Settings
 
@@ -22,38 +24,82 @@ class DataLoader:
         """
         Загружает данные об артефактах в DataFrame.
         Источник выбирается автоматически по формату файла.
+        Результат кэшируется до изменения файла (mtime).
         """
-        if self.file.suffix.lower() == ".json":
-            return self._load_json()
-        return self._load_excel()
+        return _load_cached(str(self.file), self.file.stat().st_mtime)
 
-    def _load_json(self) -> pd.DataFrame:
+    @staticmethod
+    def _load_json(file: Path) -> pd.DataFrame:
         """
         Загружает данные из JSON-формата и приводит их к табличному виду.
         Формирует таблицу с колонками:
           «Имя», «Тир», все свойства (отсутствующие заполняются нулями).
         """
-        with self.file.open(encoding="utf-8") as f:
-            data: Dict[str, Dict[str, Dict[str, Any]]] = json.load(f)
+        data: Dict[str, Dict[str, Dict[str, Any]]] = orjson.loads(file.read_bytes())
+        return DataLoader._frame_from_items(data.items())
 
-        rows: List[Dict[str, Any]] = []
-        for art_name, tiers in data.items():
+    @staticmethod
+    def _frame_from_items(items: Iterable[Tuple[str, Dict[str, Dict[str, Any]]]]) -> pd.DataFrame:
+        """
+        Собирает таблицу по колонкам за один проход по парам (артефакт, тиры).
+        Свойство, впервые встреченное не в первой строке, добивается нулями сверху.
+        """
+        names: List[str] = []
+        tier_nums: List[int] = []
+        cols: Dict[str, List[float]] = {}
+        for art_name, tiers in items:
             for tier_str, props in tiers.items():
-                rows.append({
-                    "Имя": art_name,
-                    "Тир": int(tier_str),
-                    **props
-                })
-
-        df_all = pd.DataFrame(rows).fillna(0)
+                row_idx = len(names)
+                names.append(art_name)
+                tier_nums.append(int(tier_str))
+                for k in props:
+                    if k not in cols:
+                        cols[k] = [0.0] * row_idx
+                for k, col in cols.items():
+                    col.append(props.get(k, 0.0))
 
-        return df_all.reset_index(drop=True)
+        return pd.DataFrame({"Имя": names, "Тир": tier_nums, **cols})
 
-    def _load_excel(self) -> pd.DataFrame:
+    @staticmethod
+    def _load_excel(file: Path) -> pd.DataFrame:
         """
         Загружает данные из Excel (.xlsx).
         Используется как fallback для совместимости со старым форматом.
         """
-        df = pd.read_excel(self.file, sheet_name=0).fillna(0)
+        df = pd.read_excel(file,
+                           sheet_name=0,
+                           engine="openpyxl",
+                           engine_kwargs={"read_only": True, "data_only": True}
+                           ).fillna(0)
         return df.reset_index(drop=True)
 
+    @staticmethod
+    def _compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Переводит целочисленные по значениям колонки свойств в int32.
+        Колонки с дробями остаются float64: float32 сдвинул бы границы в ILP.
+        """
+        for col in df.columns.drop(["Имя", "Тир"], errors="ignore"):
+            if not pd.api.types.is_float_dtype(df[col]):
+                continue
+            values = df[col].to_numpy()
+            if np.array_equal(values, np.trunc(values)):
+                df[col] = values.astype(np.int32)
+        return df
+
+
+@st.cache_data(show_spinner=False)
+def _load_cached(path_str: str, mtime: float) -> pd.DataFrame:
+    """
+    Читает таблицу артефактов один раз на версию файла.
+    mtime участвует только в ключе кэша.
+    """
+    file = Path(path_str)
+    if file.suffix.lower() == ".json":
+        df = DataLoader._load_json(file)
+    else:
+        df = DataLoader._load_excel(file)
+    df = DataLoader._compact_dtypes(df)
+    df["Имя"] = df["Имя"].astype("category")
+    return df
+
@@ -1,10 +1,18 @@
+import numpy as np
 import pandas as pd
 from io import BytesIO
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 
 from src.utils.helpers import Settings
 from src.utils.constants import build_label_alt, build_label_det
 
+COLOR_SCALE_FORMAT = {
+    "type": "3_color_scale",
+    "min_color": "#FF0000",
+    "mid_color": "#FFFF00",
+    "max_color": "#00FF00",
+}
+
 
 class ExcelExporter:
     """Создаёт и оформляет Excel-отчёты по результатам расчётов.
@@ -42,100 +50,110 @@ class ExcelExporter:
                        best: Dict[str, Any],
                        alts: List[Dict[str, Any]]
                        ) -> pd.DataFrame:
-        det_row: Dict[str, Any] = {
-            "Type": f"{build_label_det}",
-            "Run": None,
-            "Sheet": f"{build_label_det}",
-            "Score": best.get("score", 0.0),
-        }
-        for k in self.stat_keys:
-            det_row[k] = best.get("stats", {}).get(k, 0.0)
+        n_keys = len(self.stat_keys)
+        best_stats = best.get("stats", {})
 
-        alt_rows: List[Dict[str, Any]] = []
+        stats_matrix = np.zeros((1 + len(alts), n_keys))
+        stats_matrix[0] = np.fromiter(
+            (best_stats.get(k, 0.0) for k in self.stat_keys), dtype=float, count=n_keys
+        )
         for idx, alt in enumerate(alts, 1):
-            row: Dict[str, Any] = {
-                "Type": f"{build_label_alt}",
-                "Run": alt.get("run", idx),
-                "Sheet": f"Альт {idx}",
-                "Score": alt.get("score", 0.0),
-            }
-            for k in self.stat_keys:
-                row[k] = alt.get(k, 0.0)
-            alt_rows.append(row)
-
-        rows = [det_row] + alt_rows
-        df_all = pd.DataFrame(rows)
-
-        mask_nonzero = ~(df_all[self.stat_keys] == 0).all(axis=1)
-        df_filtered = df_all[mask_nonzero]
+            stats_matrix[idx] = np.fromiter(
+                (alt.get(k, 0.0) for k in self.stat_keys), dtype=float, count=n_keys
+            )
 
-        cols = ["Type", "Run", "Sheet", "Score", *self.stat_keys]
-        return df_filtered[cols]
+        df_all = pd.DataFrame({
+            "Type": [build_label_det] + [build_label_alt] * len(alts),
+            "Run": [None] + [alt.get("run", idx) for idx, alt in enumerate(alts, 1)],
+            "Sheet": [build_label_det] + [f"Альт {idx}" for idx in range(1, len(alts) + 1)],
+            "Score": [best.get("score", 0.0)] + [alt.get("score", 0.0) for alt in alts],
+            **dict(zip(self.stat_keys, stats_matrix.T)),
+        })
+
+        mask_nonzero = stats_matrix.any(axis=1)
+        return df_all[mask_nonzero]
+
+    def _build_frames(self,
+                      best: Dict[str, Any],
+                      alts: List[Dict[str, Any]]
+                      ) -> List[Tuple[str, pd.DataFrame]]:
+        """
+        Готовит листы с составом сборок из одной общей матрицы количеств
+        (сборки x уникальные пары артефакт/тир), порядок — по тиру и имени.
+        """
+        builds = [best["build"], *(alt["build"] for alt in alts)]
+        keys = sorted({(name, int(tier)) for build in builds for name, tier, _ in build},
+                      key=lambda k: (k[1], k[0]))
+        pos = {k: i for i, k in enumerate(keys)}
+
+        counts = np.zeros((len(builds), len(keys)), dtype=np.int32)
+        for row, build in enumerate(builds):
+            for name, tier, cnt in build:
+                counts[row, pos[(name, int(tier))]] = cnt
+
+        names = np.array([name for name, _ in keys], dtype=object)
+        tiers = np.array([tier for _, tier in keys], dtype=np.int32)
+        sheet_names = [build_label_det, *(f"Альт {idx}" for idx in range(1, len(alts) + 1))]
+
+        frames: List[Tuple[str, pd.DataFrame]] = []
+        for sheet_name, row in zip(sheet_names, counts):
+            nonzero = row > 0
+            frames.append((sheet_name, pd.DataFrame({
+                self.col_map["Artifact"]: names[nonzero],
+                self.col_map["Tier"]: tiers[nonzero],
+                self.col_map["Count"]: row[nonzero],
+            })))
+        return frames
+
+    def _comparison_width(self, col: str) -> int:
+        if col in (self.col_map["Type"], self.col_map["Sheet"]):
+            return 14
+        if col in (self.col_map["Run"], self.col_map["Score"]):
+            return 8
+        return 16
+
+    def _scaled_column_indices(self, columns: pd.Index) -> List[int]:
+        """Индексы колонок, которые раскрашиваются цветовой шкалой (все, кроме служебных)."""
+        skip = {self.col_map["Type"], self.col_map["Run"], self.col_map["Sheet"]}
+        return [idx for idx, col in enumerate(columns) if col not in skip]
 
     def build_bytes(self,
                     best: Dict[str, Any],
                     alts: List[Dict[str, Any]]
                     ) -> bytes:
+        """
+        Собирает xlsx-отчёт: лист сравнения и по листу на каждую сборку.
+        """
         buf = BytesIO()
 
-        with pd.ExcelWriter(buf, engine="xlsxwriter") as writer:
-            comp_df = (
-                self._comparison_df(best, alts)
-                .rename(columns=self.col_map)
-            )
+        with pd.ExcelWriter(buf,
+                            engine="xlsxwriter",
+                            engine_kwargs={"options": {"strings_to_urls": False}}
+                            ) as writer:
+            raw_df = self._comparison_df(best, alts)
+            comp_df = raw_df.rename(columns=self.col_map)
             comp_df.to_excel(writer, sheet_name="Сравнение", index=False)
             ws = writer.sheets["Сравнение"]
             ws.autofilter(0, 0, len(comp_df), len(comp_df.columns) - 1)
 
             for idx, col in enumerate(comp_df.columns):
-                if col in (self.col_map["Type"], self.col_map["Sheet"]):
-                    width = 14
-                elif col in (self.col_map["Run"], self.col_map["Score"]):
-                    width = 8
-                else:
-                    width = 16
-                ws.set_column(idx, idx, width)
+                ws.set_column(idx, idx, self._comparison_width(col))
 
             sheet_col = comp_df.columns.get_loc(self.col_map["Sheet"])
-            for row_num, sheet_name in enumerate(
-                    self._comparison_df(best, alts)["Sheet"], start=1):
+            for row_num, sheet_name in enumerate(raw_df["Sheet"], start=1):
                 if pd.notna(sheet_name):
                     url = f"internal:'{sheet_name}'!A1"
                     ws.write_url(row_num, sheet_col, url, string=sheet_name)
 
             last_row = len(comp_df)
-            for idx, col in enumerate(comp_df.columns):
-                if col in (self.col_map["Type"], self.col_map["Run"], self.col_map["Sheet"]):
-                    continue
-                ws.conditional_format(
-                    1, idx, last_row, idx,
-                    {
-                        "type": "3_color_scale",
-                        "min_color": "#FF0000",
-                        "mid_color": "#FFFF00",
-                        "max_color": "#00FF00",
-                    }
-                )
-
-            det_df = pd.DataFrame(best["build"],
-                                  columns=["Artifact", "Tier", "Count"]
-                                  ).rename(columns=self.col_map)
-
-            det_df.to_excel(writer, sheet_name=build_label_det, index=False)
-            ws_det = writer.sheets[build_label_det]
-            ws_det.set_column(0, 0, 20)
-            ws_det.set_column(1, 2, 8)
-
-            for idx, alt in enumerate(alts, 1):
-                alt_df = pd.DataFrame(
-                    alt["build"],
-                    columns=["Artifact", "Tier", "Count"]
-                ).rename(columns=self.col_map)
-                sheet_name = f"Альт {idx}"
-                alt_df.to_excel(writer, sheet_name=sheet_name, index=False)
-                ws_alt = writer.sheets[sheet_name]
-                ws_alt.set_column(0, 0, 20)
-                ws_alt.set_column(1, 2, 8)
+            for idx in self._scaled_column_indices(comp_df.columns):
+                ws.conditional_format(1, idx, last_row, idx, COLOR_SCALE_FORMAT)
+
+            for sheet_name, build_df in self._build_frames(best, alts):
+                build_df.to_excel(writer, sheet_name=sheet_name, index=False)
+                ws_build = writer.sheets[sheet_name]
+                ws_build.set_column(0, 0, 20)
+                ws_build.set_column(1, 2, 8)
 
         buf.seek(0)
         return buf.read()
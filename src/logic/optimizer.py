@@ -1,13 +1,29 @@
 import random
+import numpy as np
 import pandas as pd
 import pulp as pl
 from collections import Counter
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Iterable, Tuple
 
 from src.utils.helpers import Settings, Props
 from src.logic.data_loader import DataLoader
 from src.utils.cache_utils import get_or_compute_achievable
 
+HIGHS_AVAILABLE = pl.HiGHS(msg=False).available()
+ALT_SEED = 0  # одинаковые входные данные дают одинаковые альтернативы
+
+
+def mip_solver(**options: Any) -> pl.LpSolver:
+    """
+    Возвращает солвер для MILP: HiGHS прямо в процессе (если установлен highspy),
+    иначе CBC через подпроцесс. timeLimit и gapRel понимают оба; warmStart
+    учитывает только CBC — HiGHS в PuLP стартовое решение не загружает.
+    """
+    if HIGHS_AVAILABLE:
+        options.pop("warmStart", None)
+        return pl.HiGHS(msg=False, **options)
+    return pl.PULP_CBC_CMD(msg=False, **options)
+
 
 class CoefficientCalculator:
     """
@@ -19,27 +35,27 @@ class CoefficientCalculator:
         self.props = props.data
         self.df = df
         self.N = len(df)
-        self.coef: Dict[str, List[float]] = {}
+        self.coef: Dict[str, np.ndarray] = {}
 
-    @staticmethod
-    def _value_from_row(row: pd.Series, meta: Dict[str, Any]) -> float:
+    def _column_values(self, meta: Dict[str, Any]) -> np.ndarray:
         if "column" in meta:
-            return meta.get("sign", 1) * row[meta["column"]]
-        return meta.get("sign", 1) * (row[meta["col_out"]] - row[meta["col_in"]])
+            return meta.get("sign", 1) * self.df[meta["column"]].to_numpy(dtype=np.float64)
+        return meta.get("sign", 1) * (
+            self.df[meta["col_out"]].to_numpy(dtype=np.float64)
+            - self.df[meta["col_in"]].to_numpy(dtype=np.float64)
+        )
 
     def compute(self) -> None:
         for prop_name, meta in self.props.items():
             if "expr" in meta:
-                self.coef[prop_name] = [float(meta["expr"])] * self.N
+                values = np.full(self.N, float(meta["expr"]))
             elif "column" in meta:
-                self.coef[prop_name] = [
-                    self._value_from_row(r, meta) for _, r in self.df.iterrows()
-                ]
+                values = self._column_values(meta)
             else:
-                self.coef[prop_name] = [
-                    sum(self._value_from_row(r, m) for m in meta["group"])
-                    for _, r in self.df.iterrows()
-                ]
+                values = np.zeros(self.N)
+                for m in meta["group"]:
+                    values += self._column_values(m)
+            self.coef[prop_name] = values
 
 
 class ILPSolver:
@@ -53,42 +69,108 @@ class ILPSolver:
 
     def __init__(self,
                  df: pd.DataFrame,
-                 coef: Dict[str, List[float]],
+                 coef: Dict[str, np.ndarray],
                  props: Dict[str, Any],
                  settings: Settings,
                  fixed_artifacts: list[tuple[str, int]] | None = None
                  ) -> None:
         self.df = df
-        self.coef = coef
+        self.coef = {p: np.ascontiguousarray(v, dtype=np.float64) for p, v in coef.items()}
+        self._nz = {p: np.flatnonzero(c) for p, c in self.coef.items()}
+        self._names = self.df["Имя"].to_numpy()
+        self._tiers = self.df["Тир"].to_numpy()
         self.props = props
         self.set = settings
         self.N = len(df)
         self.fixed_artifacts = fixed_artifacts or []
         self.fixed_counts = Counter(self.fixed_artifacts)
+        # Строки зафиксированных артефактов и их количества — один проход по индексу (имя, тир)
+        row_of = {(n, t): i for i, (n, t) in enumerate(zip(self._names.tolist(), self._tiers.tolist()))}
+        self._fixed_rows: List[Tuple[int, int]] = sorted(
+            (row_of[key], cnt) for key, cnt in self.fixed_counts.items() if key in row_of
+        )
+        self._rng = np.random.default_rng()
+
+    def _affine(self,
+                x: Dict[int, pl.LpVariable],
+                prop_name: str,
+                scale: float = 1.0,
+                constant: float = 0.0
+                ) -> pl.LpAffineExpression:
+        """
+        Собирает scale * Σ coef_i * x_i + constant одним словарём,
+        пропуская нулевые коэффициенты.
+        """
+        c = self.coef[prop_name]
+        nz = self._nz[prop_name]
+        return pl.LpAffineExpression(
+            list(zip([x[i] for i in nz.tolist()], (c[nz] * scale).tolist())),
+            constant=constant,
+        )
 
-    def _get_achievable_max(self, prop_name: str) -> float:
-        if not hasattr(self, '_achievable_max_cache'):
-            self._achievable_max_cache: Dict[str, float] = {}
-
-        if prop_name not in self._achievable_max_cache:
-            prob = pl.LpProblem(f"Max_{prop_name}", pl.LpMaximize)
-            x_vars = {i: pl.LpVariable(f"x_{prop_name}_{i}", 0, self.set.max_copy, pl.LpInteger)
+    @staticmethod
+    def _slot_sum(variables: Iterable[pl.LpVariable]) -> pl.LpAffineExpression:
+        return pl.LpAffineExpression([(v, 1) for v in variables])
+
+    def _extrema_model(self) -> Tuple[pl.LpProblem, Dict[int, pl.LpVariable]]:
+        """
+        Общая модель для поиска достижимых экстремумов: ограничения по всем
+        свойствам и слотам строятся один раз, меняются только цель и направление.
+        """
+        if not hasattr(self, '_extrema_prob'):
+            prob = pl.LpProblem("Extrema", pl.LpMaximize)
+            x_vars = {i: pl.LpVariable(f"xe_{i}", 0, self.set.max_copy, pl.LpInteger)
                       for i in range(self.N)}
 
             for p, meta in self.props.items():
-                expr = pl.lpSum(self.coef[p][i] * x_vars[i] for i in range(self.N))
+                if not meta.get('use', False):
+                    continue
+                expr = self._affine(x_vars, p)
                 if (low := meta.get('low')) is not None:
-                    prob += expr >= low
+                    prob += (expr >= low, f"{p}_low")
                 if (high := meta.get('high')) not in (None, 0):
-                    prob += expr <= high
+                    prob += (expr <= high, f"{p}_high")
+
+            prob += (self._slot_sum(x_vars.values()) == self.set.num_slots, "slots_total")
+            self._extrema_prob, self._extrema_x = prob, x_vars
+
+        return self._extrema_prob, self._extrema_x
+
+    def set_num_slots(self, num_slots: int) -> None:
+        """
+        Переводит уже построенную модель экстремумов на другое число слотов:
+        меняются только правые части ограничений на слоты, сама модель
+        не перестраивается. Кэши экстремумов сбрасываются.
+        """
+        self.set.num_slots = num_slots
+        if hasattr(self, '_extrema_prob'):
+            for name in ("slots_total", "slots_low", "slots_high"):
+                if (constraint := self._extrema_prob.constraints.get(name)) is not None:
+                    constraint.changeRHS(num_slots)
+        for cache in ('_achievable_max_cache', '_achievable_min_cache'):
+            if hasattr(self, cache):
+                getattr(self, cache).clear()
+
+    def _solve_extremum(self, prop_name: str, sense: int) -> float:
+        """
+        Решает общую модель с целью Σ coef_p * x в заданном направлении.
+        Под CBC предыдущее решение подаётся как стартовое (warmStart),
+        под HiGHS каждое решение идёт с нуля.
+        """
+        prob, x_vars = self._extrema_model()
+        prob.sense = sense
+        prob.setObjective(self._affine(x_vars, prop_name))
+        prob.solve(mip_solver(timeLimit=5, warmStart=True))
+        if pl.LpStatus[prob.status] != 'Optimal':
+            return 0.0
+        return float(pl.value(prob.objective) or 0.0)
 
-            prob += pl.lpSum(x_vars.values()) == self.set.num_slots
-            prob += pl.lpSum(self.coef[prop_name][i] * x_vars[i] for i in range(self.N))
-            prob.solve(pl.PULP_CBC_CMD(msg=False, timeLimit=5))
-            max_val = (sum(self.coef[prop_name][i] * x_vars[i].value() for i in range(self.N))
-                       if pl.LpStatus[prob.status] == 'Optimal' else 0.0)
+    def _get_achievable_max(self, prop_name: str) -> float:
+        if not hasattr(self, '_achievable_max_cache'):
+            self._achievable_max_cache: Dict[str, float] = {}
 
-            self._achievable_max_cache[prop_name] = max_val
+        if prop_name not in self._achievable_max_cache:
+            self._achievable_max_cache[prop_name] = self._solve_extremum(prop_name, pl.LpMaximize)
 
         return self._achievable_max_cache[prop_name]
 
@@ -97,27 +179,26 @@ class ILPSolver:
             self._achievable_min_cache: Dict[str, float] = {}
 
         if prop_name not in self._achievable_min_cache:
-            prob = pl.LpProblem(f"Min_{prop_name}", pl.LpMinimize)
-            x_vars = {i: pl.LpVariable(f"x_{prop_name}_{i}", 0, self.set.max_copy, pl.LpInteger)
-                      for i in range(self.N)}
-
-            for p, meta in self.props.items():
-                expr = pl.lpSum(self.coef[p][i] * x_vars[i] for i in range(self.N))
-                if (low := meta.get('low')) is not None:
-                    prob += expr >= low
-                if (high := meta.get('high')) not in (None, 0):
-                    prob += expr <= high
-
-            prob += pl.lpSum(x_vars.values()) == self.set.num_slots
-            prob += pl.lpSum(self.coef[prop_name][i] * x_vars[i] for i in range(self.N))
-            prob.solve(pl.PULP_CBC_CMD(msg=False, timeLimit=5))
-            min_val = (sum(self.coef[prop_name][i] * x_vars[i].value() for i in range(self.N))
-                       if pl.LpStatus[prob.status] == 'Optimal' else 0.0)
-
-            self._achievable_min_cache[prop_name] = min_val
+            self._achievable_min_cache[prop_name] = self._solve_extremum(prop_name, pl.LpMinimize)
 
         return self._achievable_min_cache[prop_name]
 
+    def _extract_solution(self,
+                          x: Dict[int, pl.LpVariable]
+                          ) -> Tuple[List[Tuple[str, int, int]], Dict[str, float]]:
+        """
+        Считывает значения переменных один раз и по ним собирает
+        состав сборки и итоговые значения свойств.
+        """
+        # HiGHS отдаёт почти целые значения (2.999999999999996, 3.6e-15) — округляем до фильтра и статов
+        vals = np.rint(np.fromiter((x[i].value() or 0.0 for i in range(self.N)), dtype=np.float64, count=self.N))
+        nz = np.flatnonzero(vals > 0)
+        build = list(zip(self._names[nz].tolist(),
+                         self._tiers[nz].tolist(),
+                         vals[nz].astype(int).tolist()))
+        stats = {p: float(self.coef[p] @ vals) for p in self.props}
+        return build, stats
+
     def _compute_all_achievable(self) -> Tuple[Dict[str, Any], Dict[str, float]]:
         maxima = {p: self._get_achievable_max(p) for p in self.props}
         return self.props, maxima
@@ -136,25 +217,23 @@ class ILPSolver:
         x = {i: pl.LpVariable(f"x{i}", 0, self.set.max_copy, pl.LpInteger)
              for i in range(self.N)}
 
-        for i, row in self.df.iterrows():
-            cnt_fixed = self.fixed_counts.get((row['Имя'], row['Тир']), 0)
-            if cnt_fixed > 0:
-                prob += x[i] == cnt_fixed
+        for i, cnt_fixed in self._fixed_rows:
+            prob += x[i] == cnt_fixed
 
         for p, meta in self.props.items():
             if not meta.get("use", False):
                 continue
-            expr = pl.lpSum(self.coef[p][i] * x[i] for i in range(self.N))
+            expr = self._affine(x, p)
             if (low := meta.get('low')) is not None:
                 prob += expr >= low
             if (high := meta.get('high')) not in (None, 0):
                 prob += expr <= high
 
-        prob += pl.lpSum(x.values()) == self.set.num_slots
+        prob += self._slot_sum(x.values()) == self.set.num_slots
 
         if cuts:
             for cut in cuts:
-                prob += pl.lpSum(x[i] for i in cut) <= self.set.num_slots - 1
+                prob += self._slot_sum(x[i] for i in cut) <= self.set.num_slots - 1
 
         terms: List[Any] = []
         for p, meta in self.props.items():
@@ -163,7 +242,6 @@ class ILPSolver:
             prio = meta.get('priority', 0)
             if prio <= 0:
                 continue
-            raw_expr = pl.lpSum(self.coef[p][i] * x[i] for i in range(self.N))
             achievable = self._achievable_max_cache.get(p, 1.0)
             low_raw = meta.get('low')
             high_raw = meta.get('high')
@@ -174,7 +252,7 @@ class ILPSolver:
             if span <= 0:
                 span = 1.0
 
-            val_norm = (raw_expr - low_eff) / span
+            val_norm = self._affine(x, p, 1.0 / span, -low_eff / span)
             low_norm = 0.0
             high_norm = 1.0
 
@@ -193,16 +271,12 @@ class ILPSolver:
             terms.append(prio * val_norm - lam * delta)
 
         prob += pl.lpSum(terms)
-        prob.solve(pl.PULP_CBC_CMD(msg=False))
+        prob.solve(mip_solver())
 
         if pl.LpStatus[prob.status] != 'Optimal':
             return [], {}, 0.0
 
-        build = [
-            (self.df.loc[i, 'Имя'], self.df.loc[i, 'Тир'], int(x[i].value()))
-            for i in range(self.N) if x[i].value() > 0
-        ]
-        stats = {p: sum(self.coef[p][i] * x[i].value() for i in range(self.N)) for p in self.props}
+        build, stats = self._extract_solution(x)
         score = float(pl.value(prob.objective) or 0.0)
 
         return build, stats, score
@@ -217,34 +291,56 @@ class ILPSolver:
             self.props,
             lambda settings: self._compute_all_achievable()
         )
+        return self._solve_once_core(jitter, cuts)
 
-        if not hasattr(self, '_base_model'):
-            self._base_model = pl.LpProblem("ArtifactOptim", pl.LpMaximize)
-            self._x = {i: pl.LpVariable(f"x{i}", 0, self.set.max_copy, pl.LpInteger) for i in range(self.N)}
+    def _build_base_model(self) -> Tuple[pl.LpProblem, Dict[int, pl.LpVariable]]:
+        """
+        Базовая модель для альтернатив: ограничения без цели,
+        строится один раз на решатель.
+        """
+        prob = pl.LpProblem("ArtifactOptim", pl.LpMaximize)
+        x = {i: pl.LpVariable(f"x{i}", 0, self.set.max_copy, pl.LpInteger) for i in range(self.N)}
 
-            for i, row in self.df.iterrows():
-                cnt_fixed = self.fixed_counts.get((row["Имя"], row["Тир"]), 0)
-                if cnt_fixed > 0:
-                    self._base_model += self._x[i] == cnt_fixed
+        for i, cnt_fixed in self._fixed_rows:
+            prob += x[i] == cnt_fixed
 
-            for p, meta in self.props.items():
-                if not meta.get('use', False):
-                    continue
-                expr = pl.lpSum(self.coef[p][i] * self._x[i] for i in range(self.N))
-                if (low := meta.get('low')) is not None:
-                    self._base_model += expr >= low
-                if (high := meta.get('high')) not in (None, 0):
-                    self._base_model += expr <= high
-            self._base_model += pl.lpSum(self._x.values()) == self.set.num_slots
+        for p, meta in self.props.items():
+            if not meta.get('use', False):
+                continue
+            expr = self._affine(x, p)
+            if (low := meta.get('low')) is not None:
+                prob += expr >= low
+            if (high := meta.get('high')) not in (None, 0):
+                prob += expr <= high
+        slots = self._slot_sum(x.values())
+        prob += slots == self.set.num_slots
+        return prob, x
+
+    def _solve_once_core(self,
+                         jitter: float = 0.0,
+                         cuts: List[List[int]] | None = None,
+                         rng: np.random.Generator | None = None
+                         ) -> Tuple[List[Tuple[str, int, int]], Dict[str, float], float]:
+        """
+        Решение для альтернативы при уже заполненном _achievable_max_cache.
+        Не обращается к session_state; джиттер берётся из переданного rng.
+        """
+        if not hasattr(self, '_base_model'):
+            self._base_model, self._x = self._build_base_model()
 
-        model = self._base_model.copy()
+        model = self._base_model
+        cut_names: List[str] = []
+        for k, cut in enumerate(cuts or []):
+            name = f"cut_{k}"
+            model += (self._slot_sum(self._x[i] for i in cut) <= self.set.num_slots - 1, name)
+            cut_names.append(name)
 
-        if cuts:
-            for cut in cuts:
-                model += pl.lpSum(self._x[i] for i in cut) <= self.set.num_slots - 1
-        terms = []
+        # Цель — одна линейная форма: взвешенные нормированные коэффициенты складываются в NumPy
+        obj_coef = np.zeros(self.N)
+        obj_const = 0.0
+        jitters = (rng if rng is not None else self._rng).uniform(-1.0, 1.0, size=len(self.props))
 
-        for p, meta in self.props.items():
+        for prop_idx, (p, meta) in enumerate(self.props.items()):
             if not meta.get("use", False):
                 continue
             prio = meta.get("priority", 0)
@@ -260,24 +356,25 @@ class ILPSolver:
             if span <= 0:
                 span = 1.0
 
-            raw_expr = pl.lpSum(self.coef[p][i] * self._x[i] for i in range(self.N))
-            norm_expr = (raw_expr - low_raw) / span
-
-            weight = prio * (1 + jitter * random.uniform(-1, 1))
-            terms.append(weight * norm_expr)
-
-        model += pl.lpSum(terms)
-        model.solve(pl.PULP_CBC_CMD(msg=False, timeLimit=1, gapRel=0.02))
+            weight = prio * (1 + jitter * jitters[prop_idx])
+            obj_coef += (weight / span) * self.coef[p]
+            obj_const -= weight * low_raw / span
+
+        nz = np.flatnonzero(obj_coef)
+        model.setObjective(pl.LpAffineExpression(
+            list(zip([self._x[i] for i in nz.tolist()], obj_coef[nz].tolist())),
+            constant=obj_const,
+        ))
+        try:
+            model.solve(mip_solver(timeLimit=1, gapRel=0.02))
+        finally:
+            for name in cut_names:
+                del model.constraints[name]
 
         if pl.LpStatus[model.status] != 'Optimal':
             return [], {}, 0.0
 
-        build = [
-            (self.df.loc[i, 'Имя'], self.df.loc[i, 'Тир'], int(self._x[i].value()))
-            for i in range(self.N)
-            if self._x[i].value() > 0
-        ]
-        stats = {p: sum(self.coef[p][i] * self._x[i].value() for i in range(self.N)) for p in self.props}
+        build, stats = self._extract_solution(self._x)
         score = float(pl.value(model.objective) or 0.0)
 
         return build, stats, score
@@ -292,19 +389,18 @@ class ArtifactBuildManager:
         self.settings = settings
         self.props = props.data
         full_df = DataLoader(self.settings).load()
+        names = full_df["Имя"]
+        bl_codes = names.cat.categories.get_indexer(list(settings.blacklist))
         base_df = full_df[
             (full_df["Тир"] == settings.tier) &
-            (~full_df["Имя"].isin(settings.blacklist))
+            (~names.cat.codes.isin(bl_codes))
             ]
 
-        fixed_rows: List[pd.DataFrame] = []
-        for name, tier in fixed_artifacts:
-            rows = full_df[(full_df["Имя"] == name) & (full_df["Тир"] == tier)]
-            if not rows.empty:
-                fixed_rows.append(rows)
-
-        if fixed_rows:
-            solver_df = pd.concat([base_df, *fixed_rows], ignore_index=True)
+        # Строки зафиксированных артефактов — одна проверка по индексу (имя, тир) вместо маски на каждый
+        if fixed_artifacts:
+            keys = pd.MultiIndex.from_arrays([names, full_df["Тир"]])
+            fixed_df = full_df[keys.isin(list(set(fixed_artifacts)))]
+            solver_df = pd.concat([base_df, fixed_df], ignore_index=True)
         else:
             solver_df = base_df.copy()
 
@@ -327,26 +423,40 @@ class ArtifactBuildManager:
             fixed_artifacts
         )
 
+        self._row_index = {
+            (n, t): i for i, (n, t) in enumerate(zip(self.df["Имя"], self.df["Тир"]))
+        }
+
         self.best: Dict[str, Any] = {}
         self.alts: List[Dict[str, Any]] = []
         self.fixed_artifacts = fixed_artifacts
 
+    def _build_cut(self, build: List[Tuple[str, int, int]]) -> List[int]:
+        return sorted(self._row_index[(n, t)] for n, t, _ in build)
+
     def run(self) -> None:
         best_list, stats, score = self.solver.solve_balanced()
         self.best = {"build": best_list, "stats": stats, "score": score}
 
-        best_counts = {(n, t): c for n, t, c in best_list}
-        det_cut = [
-            idx for idx, (_, row) in enumerate(self.df.iterrows())
-            if best_counts.get((row["Имя"], row["Тир"]), 0) > 0
-        ]
-        cuts: List[List[int]] = [det_cut]
-
+        cuts: List[List[int]] = [self._build_cut(best_list)]
+        cut_sets: List[frozenset[int]] = [frozenset(cuts[0])]
         results: List[Dict[str, Any]] = []
+
+        if not best_list:
+            self.alts = results
+            return
+
+        # Все альтернативы решаются на одной базовой модели; джиттер — из фиксированного сида
+        rng = np.random.default_rng(ALT_SEED)
         for _ in range(self.settings.alt_runs):
-            alt_list, alt_stats, alt_score = self.solver.solve_once(
-                jitter=self.settings.alt_jitter,
-                cuts=cuts
+            if len(results) >= self.settings.alt_cnt:
+                break
+            # Отсечение по S следует из отсечения по любому надмножеству S,
+            # поэтому в модель уходят только максимальные по включению множества
+            active = [c for c, cs in zip(cuts, cut_sets)
+                      if not any(cs < other for other in cut_sets)]
+            alt_list, alt_stats, alt_score = self.solver._solve_once_core(
+                self.settings.alt_jitter, active, rng
             )
             if not alt_list:
                 continue
@@ -357,15 +467,9 @@ class ArtifactBuildManager:
                 "score": alt_score,
                 **alt_stats
             })
-
-            alt_counts = {(n, t): c for n, t, c in alt_list}
-            cuts.append([
-                idx for idx, (_, row) in enumerate(self.df.iterrows())
-                if alt_counts.get((row["Имя"], row["Тир"]), 0) > 0
-            ])
-
-            if len(results) >= self.settings.alt_cnt:
-                break
+            alt_cut = self._build_cut(alt_list)
+            cuts.append(alt_cut)
+            cut_sets.append(frozenset(alt_cut))
 
         self.alts = results
 
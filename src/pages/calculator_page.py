@@ -1,13 +1,14 @@
-import json
 import time
 import base64
 import textwrap
+import orjson
+import numpy as np
 import pandas as pd
 import streamlit as st
 import extra_streamlit_components as stx
 from pathlib import Path
-from typing import Dict, List, Any
-from collections import defaultdict
+from functools import lru_cache
+from typing import Dict
 
 from src.utils.helpers import calculate_table_height
 from src.utils.constants import (ALIASES,
@@ -20,86 +21,169 @@ from src.utils.constants import (ALIASES,
                                  )
 
 
+STAT_INDEX = {k: j for j, k in enumerate(ALL_STAT_KEYS)}
+
+
+def _build_group_matrix() -> np.ndarray:
+    """Матрица знаков (группа x свойство) по правилам GROUPING_CFG."""
+    matrix = np.zeros((len(GROUPING_CFG), len(ALL_STAT_KEYS)))
+    for i, cfg in enumerate(GROUPING_CFG.values()):
+        for rule in cfg["group"]:
+            matrix[i, STAT_INDEX[rule["column"]]] = rule.get("sign", 1)
+    return matrix
+
+
+GROUP_MATRIX = _build_group_matrix()
+GROUP_NONZERO = (GROUP_MATRIX != 0).T
+GROUP_NAMES = np.array([cfg["name"] for cfg in GROUPING_CFG.values()], dtype=object)
+GROUP_COVERED = {rule["column"] for cfg in GROUPING_CFG.values() for rule in cfg["group"]}
+EXTRA_IDX = np.array([STAT_INDEX[k] for k in ALL_STAT_KEYS if k not in GROUP_COVERED], dtype=np.intp)
+EXTRA_NAMES = np.array([ALIASES.get(k, k) for k in ALL_STAT_KEYS if k not in GROUP_COVERED], dtype=object)
+STAT_COLS = [STAT_INDEX[p] for p in STAT_KEYS]
+FILTER_KEYS = tuple(f"f_{p}" for p in STAT_KEYS)
+NEGATIVE_PROPS = frozenset({"☢️ Накопление рад.", "🔪 Шанс пореза", "🦴 Шанс перелома"})
+
+_HEADER_HTML = ("<h4 style='margin:0 0 0px; font-size: 1.3em;'>{title}</h4>"
+                "<hr style='margin:0;border:0;border-top:1px solid #3D4044'>")
+CTRL_HEADER_HTML = _HEADER_HTML.format(title=" 🧩 Пульт сборки ")
+METR_HEADER_HTML = _HEADER_HTML.format(title=" 🧠 Что мы собрали? ")
+BUILD_HEADER_HTML_TPL = _HEADER_HTML.format(title="🧾 Артефактный регистр открыт: {total} ")
+
+SIGN_COLORS = ("#E74C3C", "inherit", "#4CAF50")
+METRIC_ROW_HTML = ('<tr>'
+                   '<td class="has-tooltip" data-tooltip="{desc}">{prop}</td>'
+                   '<td style="color: {color};">{val:+.1f}</td>'
+                   '</tr>')
+PICKER_PANEL_HTML = textwrap.dedent("""\
+    <div class="tooltip-container">
+      <strong>{name} (Тир {tier}) даёт:</strong>
+      <div class="custom-tooltip">
+        {items}
+      </div>
+    </div>
+""")
+METRICS_TABLE_HTML = textwrap.dedent("""\
+    <table class="custom-metrics">
+      <thead>
+        <tr><th>Свойство</th><th>Значение</th></tr>
+      </thead>
+      <tbody>
+        {rows}
+      </tbody>
+    </table>
+""")
+
+
+@st.cache_data(show_spinner=False)
+def _read_artifacts(path_str: str, mtime: float) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Разбирает JSON один раз на версию файла (mtime входит в ключ кэша)."""
+    return orjson.loads(Path(path_str).read_bytes())
+
+
 def load_artifacts() -> Dict[str, Dict[str, Dict[str, float]]]:
     if not DEFAULT_DATA_FILE.exists():
         st.error(f"Не найден {DEFAULT_DATA_FILE.as_posix()}")
         st.stop()
-    return json.loads(Path(DEFAULT_DATA_FILE).read_text(encoding="utf-8"))
+    return _read_artifacts(str(DEFAULT_DATA_FILE), DEFAULT_DATA_FILE.stat().st_mtime)
+
+
+BuildRow = tuple[str, int, int]
+BUILD_COLUMNS = ["Артефакт", "Тир", "Количество"]
 
 
 def init_session_state_df() -> None:
     ss = st.session_state
-    if "build_df" not in ss:
-        ss.build_df = pd.DataFrame(columns=["Артефакт", "Тир", "Количество"], dtype=object)
+    ss.setdefault("build_rows", [])
 
     ss.setdefault("search_q", "")
     ss.setdefault("tier_sel", 3)
 
-    for p in STAT_KEYS:
-        ss.setdefault(f"f_{p}", False)
+    for key in FILTER_KEYS:
+        ss.setdefault(key, False)
+
 
+def rows_to_df(rows: list[BuildRow]) -> pd.DataFrame:
+    """DataFrame из строк сборки — только для отображения в st.data_editor."""
+    return pd.DataFrame(rows, columns=BUILD_COLUMNS).astype({"Тир": int, "Количество": int})
 
-def df_from_encoded_build(encoded: str) -> pd.DataFrame:
-    """Переводим base64‑строку из URL/куки в DataFrame."""
-    raw = base64.urlsafe_b64decode(encoded.encode()).decode()
-    obj = json.loads(raw)
-    df = pd.DataFrame(
-        obj,
-        columns=["name", "tier", "count"],
-    ).rename(columns={"name": "Артефакт", "tier": "Тир", "count": "Количество"})
-    return df.astype({"Тир": int, "Количество": int})
 
+BUILD_FORMAT_V1 = 1
+MAX_ARTIFACT_COUNT = 25  # потолок одного артефакта в сборке; в формате v1 количество — один байт
 
-def encoded_build_from_df(df: pd.DataFrame) -> str:
-    """Сериализуем DataFrame в base64‑строку."""
-    tup = [
-        {"name": n, "tier": int(t), "count": int(c)}
-        for n, t, c in df[["Артефакт", "Тир", "Количество"]].to_records(index=False)
-    ]
-    raw = json.dumps(tup, ensure_ascii=False)
-    return base64.urlsafe_b64encode(raw.encode()).decode()
 
+def _pack_rows(records: tuple[BuildRow, ...]) -> bytes:
+    """
+    Бинарный формат v1: байт версии, затем на каждую строку
+    длина имени (1 байт), имя в UTF-8, тир (1 байт), количество (1 байт).
+    """
+    out = bytearray([BUILD_FORMAT_V1])
+    for name, tier, count in records:
+        raw = name.encode()
+        out.append(len(raw))
+        out += raw
+        out += bytes((tier, count))
+    return bytes(out)
+
+
+def _unpack_rows(data: bytes) -> tuple[BuildRow, ...]:
+    """Разбор формата v1; обрезанные или испорченные данные — ValueError."""
+    rows, pos = [], 1
+    while pos < len(data):
+        size = data[pos]
+        end = pos + 1 + size
+        if end + 2 > len(data):
+            raise ValueError("Сборка обрезана")
+        name = data[pos + 1:end].decode()  # UnicodeDecodeError — тоже ValueError
+        rows.append((name, data[end], data[end + 1]))
+        pos = end + 2
+    return tuple(rows)
+
+
+@lru_cache(maxsize=64)
+def _rows_from_encoded(encoded: str) -> tuple[BuildRow, ...]:
+    data = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+    if data[:1] == bytes([BUILD_FORMAT_V1]):
+        return _unpack_rows(data)
+
+    obj = orjson.loads(data)  # старые ссылки: JSON
+    try:
+        if obj and isinstance(obj[0], dict):
+            obj = [[o["name"], o["tier"], o["count"]] for o in obj]
+        return tuple((name, int(tier), int(count)) for name, tier, count in obj)
+    except (KeyError, IndexError, TypeError) as e:
+        raise ValueError("Неверный формат сборки") from e
+
+
+def rows_from_encoded(encoded: str) -> list[BuildRow]:
+    """
+    Переводим base64‑строку из URL/куки в строки сборки.
+    Испорченная строка — ValueError. Разбор кэшируется; наружу отдаётся новый список, чтобы правки сборки не задели кэш.
+    """
+    return list(_rows_from_encoded(encoded))
 
-def remove_zero_rows(df: pd.DataFrame) -> pd.DataFrame:
-    """Убираем строки, где Количество <= 0."""
-    return df[df["Количество"] > 0].reset_index(drop=True)
 
+@lru_cache(maxsize=64)
+def _encode_tuples(records: tuple[BuildRow, ...]) -> str:
+    return base64.urlsafe_b64encode(_pack_rows(records)).rstrip(b"=").decode("ascii")
 
-def add_artifact_to_df(name: str, tier: int, qty: int = 1) -> None:
-    """Добаляет/увеличивает позицию в build_df."""
-    df = st.session_state.build_df.copy()
-    mask = (df["Артефакт"] == name) & (df["Тир"] == tier)
 
-    if mask.any():
-        df.loc[mask, "Количество"] += qty
-    else:
-        df = pd.concat(
-            [
-                df,
-                pd.DataFrame({
-                    "Артефакт": [name],
-                    "Тир": [tier],
-                    "Количество": [qty],
-                }),
-            ],
-            ignore_index=True,
-        )
+def encoded_from_rows(rows: list[BuildRow]) -> str:
+    """Сериализуем строки сборки в base64‑строку."""
+    return _encode_tuples(tuple(rows))
 
-    st.session_state.build_df = remove_zero_rows(df)
 
+def add_artifact_to_build(name: str, tier: int, qty: int = 1) -> None:
+    """Добаляет/увеличивает позицию в build_rows."""
+    rows = st.session_state.build_rows
+    for i, (n, t, c) in enumerate(rows):
+        if n == name and t == tier:
+            rows[i] = (n, t, c + qty)
+            break
+    else:
+        rows.append((name, tier, qty))
 
-def group_by_char_length(items: List[str], max_chars: int = 50, overhead: int = 3):
-    rows, cur, cur_len = [], [], 0
-    for itm in items:
-        ln = len(itm) + overhead
-        if cur and cur_len + ln > max_chars:
-            rows.append(cur)
-            cur, cur_len = [], 0
-        cur.append(itm)
-        cur_len += ln
-    if cur:
-        rows.append(cur)
-    return rows
+    if qty < 0:
+        st.session_state.build_rows = [r for r in rows if r[2] > 0]
 
 
 def get_artifact_tooltip(art_data, name, tier, aliases):
@@ -113,248 +197,336 @@ def get_artifact_tooltip(art_data, name, tier, aliases):
     return " | \n".join(lines) or "Нет эффектов"
 
 
-def render_artifact_buttons_df(art_data: Dict, tier_sel: int, max_chars: int = 50) -> None:
-    """Печатаем сетку кнопок. Клик → add_artifact_to_df."""
-    ss = st.session_state
-    names = sorted(art_data.keys())
+@st.cache_data(show_spinner=False)
+def _tooltip_table(path_str: str, mtime: float) -> dict[tuple[str, int], str]:
+    """Готовые однострочные подсказки для каждой пары (артефакт, тир)."""
+    art_data = _read_artifacts(path_str, mtime)
+    return {
+        (name, int(tier)): get_artifact_tooltip(art_data, name, tier, ALIASES).replace("\n", "")
+        for name, tiers in art_data.items()
+        for tier in tiers
+    }
+
+
+@st.cache_data(show_spinner=False)
+def _button_index(path_str: str, mtime: float) -> tuple[tuple[str, ...], np.ndarray]:
+    """
+    Данные для фильтра сетки кнопок: отсортированные имена и их lower-версии.
+    Порядок совпадает со строками массива из load_stat_matrix.
+    """
+    names_sorted = tuple(sorted(_read_artifacts(path_str, mtime)))
+    lower_names = np.array([n.lower() for n in names_sorted])
+    return names_sorted, lower_names
+
 
-    q = ss.search_q.lower()
+def load_button_index() -> tuple[tuple[str, ...], np.ndarray]:
+    return _button_index(str(DEFAULT_DATA_FILE), DEFAULT_DATA_FILE.stat().st_mtime)
+
+
+@st.cache_data(show_spinner=False)
+def _filter_bits(path_str: str, mtime: float) -> np.ndarray:
+    """
+    Битовые маски фильтра: bits[тир-1, артефакт], бит j выставлен,
+    если свойство STAT_KEYS[j] у артефакта на этом тире положительное.
+    """
+    stats, _ = _stat_matrix(path_str, mtime)
+    weights = np.left_shift(np.uint64(1), np.arange(len(STAT_KEYS), dtype=np.uint64))
+    positive = (stats[:, :, STAT_COLS] > 0).astype(np.uint64)
+    return (positive * weights).sum(axis=-1, dtype=np.uint64).T.copy()
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _artifact_grid(path_str: str,
+                   mtime: float,
+                   tier_sel: int,
+                   q: str,
+                   active_bits: int
+                   ) -> pd.DataFrame:
+    """
+    Таблица для сетки артефактов одного тира с учётом поиска и фильтров.
+    Пересобирается только при смене тира, строки поиска или набора фильтров.
+    """
+    names_sorted, lower_names = _button_index(path_str, mtime)
+    keep = np.ones(len(names_sorted), dtype=bool)
     if q:
-        names = [n for n in names if q in n.lower()]
-
-    active_props = [p for p in STAT_KEYS if ss.get(f"f_{p}")]
-    if active_props:
-        names = [
-            n for n in names
-            if any(art_data[n][str(tier_sel)].get(p, 0) > 0 for p in active_props)
-        ]
-
-    for row in group_by_char_length(names, max_chars):
-        cols = st.columns(len(row), gap="small")
-        for col, name in zip(cols, row):
-            tooltip = get_artifact_tooltip(art_data, name, tier_sel, ALIASES)
-            if col.button(name, key=f"btn_{name}_{tier_sel}", help=tooltip, use_container_width=True):
-                add_artifact_to_df(name, tier_sel, 1)
-                st.rerun()
+        keep &= np.char.find(lower_names, q) >= 0
+    if active_bits:
+        keep &= (_filter_bits(path_str, mtime)[tier_sel - 1] & np.uint64(active_bits)) != 0
 
+    names = [names_sorted[i] for i in np.flatnonzero(keep)]
+    tooltips = _tooltip_table(path_str, mtime)
+    return pd.DataFrame({
+        "➕": [False] * len(names),
+        "Артефакт": names,
+        "Свойства": [tooltips[(name, tier_sel)] for name in names],
+    })
 
-def _collapse_duplicates(df: pd.DataFrame) -> pd.DataFrame:
-    """Складываем строки с одинаковыми (Артефакт, Тир)."""
-    if df.empty:
-        return df
 
-    agg = (
-        df.groupby(["Артефакт", "Тир"], as_index=False, sort=False)["Количество"]
-        .sum()
+def _count_in_build(name: str, tier: int) -> int:
+    return sum(q for n, t, q in st.session_state.build_rows if n == name and t == tier)
+
+
+def _add_picked(grid_key: str, tier_sel: int, names: list[str]) -> None:
+    """Колбэк сетки: добавляем отмеченные артефакты и сбрасываем галочки новой версией ключа."""
+    ss = st.session_state
+    for i, change in ss[grid_key]["edited_rows"].items():
+        name = names[int(i)]
+        if change.get("➕") and _count_in_build(name, tier_sel) < MAX_ARTIFACT_COUNT:
+            add_artifact_to_build(name, tier_sel, 1)
+    ss._grid_ver += 1
+
+
+def render_artifact_buttons_df(tier_sel: int) -> None:
+    """
+    Печатаем список артефактов одной таблицей с галочками.
+    Отмеченная галочка → add_artifact_to_build, после чего таблица сбрасывается.
+    """
+    ss = st.session_state
+    active_bits = sum(1 << j for j, key in enumerate(FILTER_KEYS) if ss[key])
+    grid = _artifact_grid(str(DEFAULT_DATA_FILE), DEFAULT_DATA_FILE.stat().st_mtime,
+                          tier_sel, ss.search_q.lower(), active_bits)
+    grid_key = f"grid_{tier_sel}_{ss.setdefault('_grid_ver', 0)}"
+    st.data_editor(
+        grid,
+        hide_index=True,
+        use_container_width=True,
+        key=grid_key,
+        on_change=_add_picked,
+        args=(grid_key, tier_sel, grid["Артефакт"].tolist()),
+        height=min(calculate_table_height(grid), 420),
+        disabled=["Артефакт", "Свойства"],
+        column_config={
+            "➕": st.column_config.CheckboxColumn("➕", help="Добавить в сборку", width="small"),
+            "Артефакт": st.column_config.TextColumn("Артефакт"),
+            "Свойства": st.column_config.TextColumn("Свойства"),
+        },
     )
 
-    agg = agg[agg["Количество"] > 0]
-    return agg.astype({"Тир": int, "Количество": int}).reset_index(drop=True)
+
+def _collapse_duplicates(rows: list[BuildRow]) -> list[BuildRow]:
+    """Складываем строки с одинаковыми (Артефакт, Тир)."""
+    acc: dict[tuple[str, int], int] = {}
+    for name, tier, qty in rows:
+        acc[(name, tier)] = acc.get((name, tier), 0) + qty
+    return [(name, tier, qty) for (name, tier), qty in acc.items() if qty > 0]
+
+
+def _apply_build_edits(editor_key: str) -> None:
+    """
+    Колбэк редакторов сборки: переносим правки (тир, количество, удаление) в build_rows.
+    Версия ключа редакторов растёт, чтобы старые правки не наложились на новые строки.
+    """
+    ss = st.session_state
+    rows = list(ss.build_rows)
+    dropped = set()
+    for i, change in ss[editor_key]["edited_rows"].items():
+        i = int(i)
+        name, tier, qty = rows[i]
+        if change.get("❌"):
+            dropped.add(i)
+            continue
+        rows[i] = (name, int(change.get("Тир") or tier), int(change.get("Количество", qty) or 0))
+    ss.build_rows = _collapse_duplicates([r for i, r in enumerate(rows) if i not in dropped])
+    ss._build_editor_ver += 1
 
 
 def render_build_editor() -> None:
-    df_original = st.session_state.build_df
+    df_original = rows_to_df(st.session_state.build_rows)
+    editor_key = f"build_df_editor_{st.session_state.setdefault('_build_editor_ver', 0)}"
 
-    df_edited = st.data_editor(
+    st.data_editor(
         df_original,
         hide_index=True,
         use_container_width=True,
-        key="build_df_editor",
+        key=editor_key,
+        on_change=_apply_build_edits,
+        args=(editor_key,),
         height=calculate_table_height(df_original),
         column_config={
             "Артефакт": st.column_config.TextColumn("Артефакт", disabled=True),
             "Тир": st.column_config.NumberColumn("Тир", min_value=1, max_value=4, step=1),
-            "Количество": st.column_config.NumberColumn("Количество", min_value=0, max_value=25, step=1),
+            "Количество": st.column_config.NumberColumn("Количество", min_value=0, max_value=MAX_ARTIFACT_COUNT, step=1),
         },
     )
 
-    if not df_edited.equals(df_original):
-        st.session_state.build_df = _collapse_duplicates(df_edited)
-        st.rerun()
-
 
 def render_build_interactive() -> None:
-    """Интерактивная правка build_df кнопками-контролами."""
-    df = st.session_state.build_df
+    """Интерактивная правка build_rows: одна таблица с выбором тира и галочкой удаления."""
+    df = rows_to_df(st.session_state.build_rows)
+    df["❌"] = False
+    editor_key = f"build_interactive_{st.session_state.setdefault('_build_editor_ver', 0)}"
 
-    hdr = st.columns([4.4, 1.2, 1.9, 0.5], gap="small")
-    hdr[1].markdown("<div style='font-size:16px; margin-bottom: 7px;'>Тир</div>", unsafe_allow_html=True)
-    hdr[2].markdown("<div style='font-size:16px; margin-bottom: 7px;'>Количество</div>", unsafe_allow_html=True)
+    st.data_editor(
+        df,
+        hide_index=True,
+        use_container_width=True,
+        key=editor_key,
+        on_change=_apply_build_edits,
+        args=(editor_key,),
+        height=calculate_table_height(df),
+        column_config={
+            "Артефакт": st.column_config.TextColumn("Артефакт", disabled=True),
+            "Тир": st.column_config.SelectboxColumn("Тир", options=[1, 2, 3, 4], required=True),
+            "Количество": st.column_config.NumberColumn("Количество", min_value=0, max_value=MAX_ARTIFACT_COUNT, step=1),
+            "❌": st.column_config.CheckboxColumn("❌", help="Убрать из сборки", width="small"),
+        },
+    )
 
-    for idx, row in df.iterrows():
-        cols = st.columns([4, 1.2, 1.9, 0.5], gap="small")
 
-        cols[0].markdown(
-            f"<div style='margin-top:5px;font-size:17px;'>"
-            f"{row['Артефакт']}</div>",
-            unsafe_allow_html=True,
-        )
+@st.cache_data(show_spinner=False)
+def _stat_matrix(path_str: str, mtime: float) -> tuple[np.ndarray, dict[str, int]]:
+    """
+    Свойства в виде массива stats[артефакт, тир-1, свойство] (колонки — ALL_STAT_KEYS)
+    и индекс имени артефакта (в порядке сортировки имён).
+    Строится один раз на версию файла данных.
+    """
+    art_data = _read_artifacts(path_str, mtime)
+    names_sorted, _ = _button_index(path_str, mtime)
+    name_to_idx = {name: i for i, name in enumerate(names_sorted)}
+    stats = np.zeros((len(art_data), 4, len(ALL_STAT_KEYS)), dtype=np.float64)
+    for name, tiers in art_data.items():
+        for tier, props in tiers.items():
+            row = stats[name_to_idx[name], int(tier) - 1]
+            for prop, value in props.items():
+                if (j := STAT_INDEX.get(prop)) is not None:
+                    row[j] = value
+    return stats, name_to_idx
 
-        new_tier = cols[1].selectbox(
-            "Тир", [1, 2, 3, 4],
-            index=int(row["Тир"]) - 1,
-            key=f"tier_{idx}",
-            label_visibility="collapsed",
-        )
 
-        new_qty = cols[2].number_input(
-            "Количество", 0, 25, int(row["Количество"]),
-            step=1,
-            key=f"qty_{idx}",
-            label_visibility="collapsed",
-        )
+def load_stat_matrix() -> tuple[np.ndarray, dict[str, int]]:
+    return _stat_matrix(str(DEFAULT_DATA_FILE), DEFAULT_DATA_FILE.stat().st_mtime)
 
-        if cols[3].button("❌", key=f"del_{idx}"):
-            st.session_state.build_df = df.drop(idx).reset_index(drop=True)
-            st.rerun()
 
-        if (new_tier != row["Тир"]) or (new_qty != row["Количество"]):
-            tmp_df = df.copy()
+def _build_arrays(rows: list[BuildRow], name_to_idx: dict[str, int]) -> tuple[np.ndarray, np.ndarray]:
+    """Строки сборки как выровненные массивы: индекс строки плоской таблицы свойств и количество."""
+    n = len(rows)
+    row_idx = np.fromiter((name_to_idx[name] * 4 + tier - 1 for name, tier, _ in rows), dtype=np.intp, count=n)
+    qty = np.fromiter((q for _, _, q in rows), dtype=np.float64, count=n)
+    return row_idx, qty
 
-            dup_mask = (
-                    (tmp_df["Артефакт"] == row["Артефакт"])
-                    & (tmp_df["Тир"] == new_tier)
-                    & (tmp_df.index != idx)
-            )
-            if dup_mask.any():
-                dup_idx = tmp_df[dup_mask].index[0]
-                tmp_df.at[dup_idx, "Количество"] += new_qty
-                tmp_df = tmp_df.drop(idx)
-            else:
-                tmp_df.at[idx, "Тир"] = new_tier
-                tmp_df.at[idx, "Количество"] = new_qty
 
-            tmp_df = tmp_df[tmp_df["Количество"] > 0].reset_index(drop=True)
-            st.session_state.build_df = tmp_df
-            st.rerun()
+def _build_contributions(rows: list[BuildRow]) -> np.ndarray:
+    """Вклад каждой строки сборки: stats[артефакт, тир] * количество (строки x ALL_STAT_KEYS)."""
+    stats, name_to_idx = load_stat_matrix()
+    row_idx, qty = _build_arrays(rows, name_to_idx)
+    return stats.reshape(-1, stats.shape[-1])[row_idx] * qty[:, None]
 
 
-def calc_summary_df(build_df: pd.DataFrame, art_data: Dict[str, Dict[str, Dict[str, float]]]):
-    res = defaultdict(float)
-    for _, row in build_df.iterrows():
-        props = art_data[row["Артефакт"]][str(int(row["Тир"]))]
-        qty = int(row["Количество"])
-        for prop in ALL_STAT_KEYS:
-            res[prop] += props.get(prop, 0.0) * qty
-    return res
+def calc_summary_df(rows: list[BuildRow]) -> Dict[str, float]:
+    stats, name_to_idx = load_stat_matrix()
+    row_idx, qty = _build_arrays(rows, name_to_idx)
+    qty_col = np.zeros(stats.shape[0] * 4)
+    np.add.at(qty_col, row_idx, qty)
+    totals = qty_col @ stats.reshape(-1, stats.shape[-1])
+    return dict(zip(ALL_STAT_KEYS, totals.tolist()))
 
 
 def assemble_metrics_df(summary: dict[str, float],
-                        build_df: pd.DataFrame,
-                        art_data: dict[str, dict[str, dict[str, float]]]
+                        build_rows: list[BuildRow]
                         ) -> pd.DataFrame:
     """
-    Собирает итоговую таблицу метрик
+    Собирает итоговую таблицу метрик: сначала группы, затем остальные свойства.
+    Строка остаётся, если значение ненулевое или хоть один артефакт его менял.
     """
-    rows: list[dict[str, Any]] = []
-    covered: set[str] = set()
-
-    for key, cfg in GROUPING_CFG.items():
-        total = sum(
-            summary.get(rule["column"], 0.0) * rule["sign"]
-            for rule in cfg["group"]
-        )
-        name = cfg["name"]
-        covered |= {rule["column"] for rule in cfg["group"]}
-        rows.append({"Свойство": name, "Значение": total})
-
-    had_change: dict[str, bool] = {}
-    for prop in summary:
-        if prop in covered:
-            continue
-        had_change[prop] = any(
-            art_data[row["Артефакт"]]
-            .get(str(int(row["Тир"])), {})
-            .get(prop, 0.0) * int(row["Количество"]) != 0
-            for _, row in build_df.iterrows()
-        )
+    vec = np.array([summary.get(k, 0.0) for k in ALL_STAT_KEYS])
+    nonzero = _build_contributions(build_rows) != 0
 
-    group_had_change: dict[str, bool] = {}
-    for key, cfg in GROUPING_CFG.items():
-        name = cfg["name"]
-        group_had_change[name] = any(
-            art_data[row["Артефакт"]]
-            .get(str(int(row["Тир"])), {})
-            .get(rule["column"], 0.0) * int(row["Количество"]) * rule["sign"] != 0
-            for _, row in build_df.iterrows()
-            for rule in cfg["group"]
-        )
-
-    for prop, val in summary.items():
-        if prop in covered:
-            continue
-        if abs(val) > 1e-6 or had_change.get(prop, False):
-            display_name = ALIASES.get(prop, prop)
-            rows.append({"Свойство": display_name, "Значение": val})
+    group_vals = GROUP_MATRIX @ vec
+    group_keep = (np.abs(group_vals) > 1e-6) | (nonzero @ GROUP_NONZERO).any(axis=0)
 
-    df = pd.DataFrame(rows)
+    extra_vals = vec[EXTRA_IDX]
+    extra_keep = (np.abs(extra_vals) > 1e-6) | nonzero[:, EXTRA_IDX].any(axis=0)
 
-    def keep_row(row):
-        name, val = row["Свойство"], row["Значение"]
+    return pd.DataFrame({
+        "Свойство": np.concatenate([GROUP_NAMES[group_keep], EXTRA_NAMES[extra_keep]]),
+        "Значение": np.concatenate([group_vals[group_keep], extra_vals[extra_keep]]),
+    })
 
-        if abs(val) > 1e-6:
-            return True
 
-        if name in group_had_change and group_had_change[name]:
-            return True
+@st.cache_data(show_spinner=False, max_entries=256)
+def _metrics_table(sig: tuple[BuildRow, ...], mtime: float) -> pd.DataFrame:
+    rows = list(sig)
+    return assemble_metrics_df(calc_summary_df(rows), rows)
 
-        atomic_key = next((k for k, v in ALIASES.items() if v == name), name)
-        if atomic_key in had_change and had_change[atomic_key]:
-            return True
-        return False
 
-    return df[df.apply(keep_row, axis=1)]
+def metrics_for_build(rows: list[BuildRow]) -> pd.DataFrame:
+    """
+    Таблица метрик сборки; пересчитывается только при изменении состава
+    (ключ — кортеж строк сборки и версия файла данных).
+    """
+    return _metrics_table(tuple(rows), DEFAULT_DATA_FILE.stat().st_mtime)
 
 
 def style_metrics_html(df: pd.DataFrame) -> str:
     """
     Генерит HTML таблицу
     """
-    rows = []
-    for _, row in df.iterrows():
-        prop = row["Свойство"]
-        raw_val = row["Значение"]
-        val_str = f"{raw_val:+.1f}"
-        desc = ALIASES_DESCR.get(prop, "")
-
-        if prop == "🌡️ Температура":
-            color = "inherit"
-        else:
-            color = "#4CAF50" if raw_val > 0 else ("#E74C3C" if raw_val < 0 else "inherit")
-
-        rows.append(
-            f'<tr>'
-            f'<td class="has-tooltip" data-tooltip="{desc}">{prop}</td>'
-            f'<td style="color: {color};">{val_str}</td>'
-            f'</tr>'
+    rows_html = "".join(
+        METRIC_ROW_HTML.format(
+            desc=ALIASES_DESCR.get(prop, ""),
+            prop=prop,
+            color="inherit" if prop == "🌡️ Температура" else SIGN_COLORS[(val > 0) - (val < 0) + 1],
+            val=val,
         )
+        for prop, val in zip(df["Свойство"].tolist(), df["Значение"].tolist())
+    )
+    return METRICS_TABLE_HTML.format(rows=rows_html)
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _metrics_html(sig: tuple[BuildRow, ...], mtime: float) -> str:
+    return style_metrics_html(_metrics_table(sig, mtime))
+
+
+def metrics_html_for_build(rows: list[BuildRow]) -> str:
+    """Готовый HTML метрик сборки; кэш по составу сборки и версии файла данных."""
+    return _metrics_html(tuple(rows), DEFAULT_DATA_FILE.stat().st_mtime)
 
-    rows_html = "".join(rows)
 
-    html = textwrap.dedent(f"""\
-        <table class="custom-metrics">
-          <thead>
-            <tr><th>Свойство</th><th>Значение</th></tr>
-          </thead>
-          <tbody>
-            {rows_html}
-          </tbody>
-        </table>
-    """)
-    return html
+@st.cache_data(show_spinner=False, max_entries=512)
+def _picker_panel_html(path_str: str, mtime: float, name: str, tier: int) -> str:
+    """HTML панели «Свойства артефакта» пульта сборки для пары (артефакт, тир)."""
+    stats, name_to_idx = _stat_matrix(path_str, mtime)
+    values = stats[name_to_idx[name], tier - 1]
+    items = []
+    for j in np.flatnonzero(np.abs(values) >= 1e-6).tolist():
+        num = float(values[j])
+        label = ALIASES.get(ALL_STAT_KEYS[j], ALL_STAT_KEYS[j])
+
+        color = "inherit"
+        if "Температура" not in label:
+            sign = -num if label in NEGATIVE_PROPS else num
+            color = SIGN_COLORS[(sign > 0) - (sign < 0) + 1]
+
+        items.append(f"<li>{label}: <span style='color:{color};'>{num:+.1f}</span></li>")
+
+    items_html = "<ul>" + ("".join(items) or "<li>Нет эффектов</li>") + "</ul>"
+    return PICKER_PANEL_HTML.format(name=name, tier=tier, items=items_html)
+
+
+def _add_simple() -> None:
+    """Колбэк кнопки «Добавить» пульта: +1 выбранного артефакта, не больше 25 штук."""
+    ss = st.session_state
+    name, tier = ss.simple_art, ss.simple_tier
+    if _count_in_build(name, tier) < MAX_ARTIFACT_COUNT:
+        add_artifact_to_build(name, tier, 1)
 
 
 def manual_calculator_page() -> None:
     init_session_state_df()
-    art_data = load_artifacts()
+    load_artifacts()
     ss = st.session_state
-    cookie_manager = stx.CookieManager(key="cookie_mgr")
+    if "_cookie_manager" not in ss:
+        ss._cookie_manager = stx.CookieManager(key="cookie_mgr")
+    else:
+        ss._cookie_manager.get_all(key="cookie_mgr")
+    cookie_manager = ss._cookie_manager
 
     if "build" in st.query_params:
         try:
             encoded = st.query_params.pop("build")
-            ss.build_df = df_from_encoded_build(encoded)
-        except Exception:
+            ss.build_rows = rows_from_encoded(encoded)
+        except ValueError:
             st.error("Не удалось загрузить сборку из ссылки.")
         finally:
             st.query_params.clear()
@@ -364,97 +536,40 @@ def manual_calculator_page() -> None:
         with left:
             st.text_input("🔍 **Поиск**", key="search_q")
             if st.toggle("Показать фильтры", value=False):
-                for p in STAT_KEYS:
-                    display_name = ALIASES.get(p, p)
-                    st.checkbox(display_name, key=f"f_{p}")
+                for p, key in zip(STAT_KEYS, FILTER_KEYS):
+                    st.checkbox(ALIASES.get(p, p), key=key)
         with right:
-            tabs = st.tabs([f"Тир {i}" for i in range(1, 5)])
-            for i, tab in enumerate(tabs, 1):
-                with tab:
-                    render_artifact_buttons_df(art_data, tier_sel=i, max_chars=65)
+            tier_sel = st.radio(
+                "Тир", [1, 2, 3, 4],
+                key="tier_sel",
+                horizontal=True,
+                format_func=lambda i: f"Тир {i}",
+                label_visibility="collapsed",
+            )
+            render_artifact_buttons_df(tier_sel=tier_sel)
 
     ctrl_col, build_col, metr_col = st.columns([1.48, 3.1, 1.9], gap="large")
 
     with ctrl_col:
-        st.markdown("""
-        <h4 style="margin:0 0 0px; font-size: 1.3em;"> 🧩 Пульт сборки </h4>
-        """, unsafe_allow_html=True)
-
-        st.markdown("<hr style='margin:0;border:0;border-top:1px solid #3D4044'>", unsafe_allow_html=True)
+        st.markdown(CTRL_HEADER_HTML, unsafe_allow_html=True)
 
         show_tt = st.toggle("Свойства артефакта", value=False, key="show_tooltips_ctrl")
-        art_name = st.selectbox("Артефакт", sorted(art_data), key="simple_art")
+        art_name = st.selectbox("Артефакт", load_button_index()[0], key="simple_art")
         tier = st.selectbox("Тир", [1, 2, 3, 4], key="simple_tier")
 
         st.markdown("<div style='height:28px'></div>", unsafe_allow_html=True)
-        if st.button("➕ Добавить", key="simple_add"):
-            current = st.session_state.build_df.loc[
-                (st.session_state.build_df["Артефакт"] == art_name) &
-                (st.session_state.build_df["Тир"] == tier),
-                "Количество"
-            ].sum()
-            if current < 25:
-                add_artifact_to_df(art_name, tier, 1)
-            else:
-                pass
-            st.rerun()
+        st.button("➕ Добавить", key="simple_add", on_click=_add_simple)
 
         if show_tt:
-            tooltip = get_artifact_tooltip(
-                art_data,
-                st.session_state.simple_art,
-                st.session_state.simple_tier,
-                ALIASES
-            )
-            items = []
-            for line in tooltip.split("|"):
-                prop, val = line.split(":")
-                val = val.strip()
-                prop = prop.strip()
-
-                color = "inherit"
-                negative_props = {"☢️ Накопление рад.", "🔪 Шанс пореза", "🦴 Шанс перелома"}
-
-                if "Температура" not in prop:
-                    num = float(val)
-                    if prop in negative_props:
-                        if num < 0:
-                            color = "#4CAF50"
-                        elif num > 0:
-                            color = "#E74C3C"
-                    else:
-                        if num > 0:
-                            color = "#4CAF50"
-                        elif num < 0:
-                            color = "#E74C3C"
-
-                items.append(
-                    f"<li>"
-                    f"{prop}: "
-                    f"<span style='color:{color};'>{val}</span>"
-                    f"</li>"
-                )
-
-            items_html = "<ul>" + "".join(items) + "</ul>"
-
-            st.markdown(f"""
-                <div class="tooltip-container">
-                  <strong>{art_name} (Тир {tier}) даёт:</strong>
-                  <div class="custom-tooltip">
-                    {items_html}
-                  </div>
-                </div>
-                """, unsafe_allow_html=True)
+            st.markdown(_picker_panel_html(str(DEFAULT_DATA_FILE), DEFAULT_DATA_FILE.stat().st_mtime,
+                                           art_name, tier),
+                        unsafe_allow_html=True)
 
     with build_col:
-        total = int(ss.build_df["Количество"].sum())
-        st.markdown(f"""
-        <h4 style='margin:0 0 0px; font-size: 1.3em;'>🧾 Артефактный регистр открыт: {total} </h4>
-        """, unsafe_allow_html=True)
-
-        st.markdown("<hr style='margin:0;border:0;border-top:1px solid #3D4044'>", unsafe_allow_html=True)
+        total = sum(q for _, _, q in ss.build_rows)
+        st.markdown(BUILD_HEADER_HTML_TPL.format(total=total), unsafe_allow_html=True)
 
-        if ss.build_df.empty:
+        if not ss.build_rows:
             st.info("""
             📍 В «Пульте сборки» всё просто: выбрал артефакт — добавил.
 
@@ -463,7 +578,7 @@ def manual_calculator_page() -> None:
             📦 Когда артефакты уже в сборке — управляй ими здесь, во вкладках:
 
             - 📋 **Таблица** — редактируй прямо в строках  
-            - 🔧 **Интерактив** — кнопочки, выпадающие списки и немного магии  
+            - 🔧 **Интерактив** — выпадающие списки тиров и галочки удаления  
             - 📝 **Текст** — для копирования, если нужно поделиться или сохранить
 
             💡 А если сборка пуста — самое время начать.
@@ -477,31 +592,25 @@ def manual_calculator_page() -> None:
                 render_build_editor()
             with tab_text:
                 txt = "\n".join(
-                    f"{i + 1}. {row['Артефакт']} (Тир {row['Тир']}) – {row['Количество']} шт."
-                    for i, row in ss.build_df.iterrows()
+                    f"{i}. {name} (Тир {tier}) – {qty} шт."
+                    for i, (name, tier, qty) in enumerate(ss.build_rows, 1)
                 )
                 st.code(txt, language="markdown")
 
     with metr_col:
-        st.markdown("""
-        <h4 style="margin:0 0 0px; font-size: 1.3em;"> 🧠 Что мы собрали? </h4>
-        """, unsafe_allow_html=True)
-
-        st.markdown("<hr style='margin:0;border:0;border-top:1px solid #3D4044'>", unsafe_allow_html=True)
-        if ss.build_df.empty:
+        st.markdown(METR_HEADER_HTML, unsafe_allow_html=True)
+        if not ss.build_rows:
             st.info("Ни одного артефакта… Лакей слегка приуныл")
         else:
             st.markdown("<br>", unsafe_allow_html=True)
-            summ = calc_summary_df(ss.build_df, art_data)
-            df_metrics = assemble_metrics_df(summ, ss.build_df, art_data)
-            st.markdown(style_metrics_html(df_metrics), unsafe_allow_html=True)
+            st.markdown(metrics_html_for_build(ss.build_rows), unsafe_allow_html=True)
 
     st.markdown("---")
 
     share_col, save_col, load_col, clear_col = st.columns(4, gap="small")
 
     if share_col.button("📤 Поделиться"):
-        encoded = encoded_build_from_df(ss.build_df)
+        encoded = encoded_from_rows(ss.build_rows)
         full_url = f"{BASE_URL}?build={encoded}"
         st.success("Персональная ссылка от Лакея")
         st.code(full_url, language="markdown", wrap_lines=True)
@@ -513,7 +622,7 @@ def manual_calculator_page() -> None:
             pass
         cookie_manager.set(
             "artifact_butler_build",
-            encoded_build_from_df(ss.build_df),
+            encoded_from_rows(ss.build_rows),
             expires_at=(pd.Timestamp.utcnow() + pd.Timedelta(days=120)).to_pydatetime(),
             path="/",
             secure=False,
@@ -526,15 +635,19 @@ def manual_calculator_page() -> None:
     if load_col.button("📥 Загрузить"):
         encoded = cookie_manager.get("artifact_butler_build")
         if encoded:
-            ss.build_df = df_from_encoded_build(encoded)
-            st.toast("Сборка загружена", icon="📥")
-            time.sleep(2)
-            st.rerun()
+            try:
+                ss.build_rows = rows_from_encoded(encoded)
+            except ValueError:
+                st.error("Не удалось загрузить сохранённую сборку.")
+            else:
+                st.toast("Сборка загружена", icon="📥")
+                time.sleep(2)
+                st.rerun()
         else:
             st.warning("Хранилище пусто. Лакей лишь вежливо покашлял.")
 
     if clear_col.button("🗑️ Очистить"):
-        ss.build_df = pd.DataFrame(columns=["Артефакт", "Тир", "Количество"], dtype=object)
+        ss.build_rows = []
         st.success("Сборка обнулена. И тишина такая… приятная.")
         time.sleep(2)
         st.rerun()
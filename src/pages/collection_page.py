@@ -1,19 +1,25 @@
-import json
+import orjson
 import pandas as pd
 import streamlit as st
+from pathlib import Path
 from typing import Dict, List, Any
 
-from src.utils.constants import BUILDS_FILE, BASE_URL
+from src.utils.constants import BUILDS_FILE, BASE_URL, DEFAULT_DATA_FILE
 from src.utils.helpers import calculate_table_height
 from src.pages.calculator_page import (
-    load_artifacts,
-    df_from_encoded_build,
-    calc_summary_df,
-    assemble_metrics_df,
-    style_metrics_html,
+    rows_from_encoded,
+    rows_to_df,
+    metrics_html_for_build,
 )
 
 
+@st.cache_data(show_spinner=False)
+def _read_builds(path_str: str, mtime: float) -> Dict[int, List[Dict[str, Any]]]:
+    """Разбор файла коллекции один раз на его версию (mtime входит в ключ кэша)."""
+    raw: Dict[str, List[Dict[str, Any]]] = orjson.loads(Path(path_str).read_bytes())
+    return {int(k): v for k, v in raw.items()}
+
+
 def _load_builds_by_slots() -> Dict[int, List[Dict[str, Any]]]:
     """
     Читаем и приводим ключи к int; если нет файла - возвращаем пустой словарь.
@@ -23,19 +29,25 @@ def _load_builds_by_slots() -> Dict[int, List[Dict[str, Any]]]:
         return {}
 
     try:
-        raw: Dict[str, List[Dict[str, Any]]] = json.loads(BUILDS_FILE.read_text(encoding="utf-8"))
-        return {int(k): v for k, v in raw.items()}
+        return _read_builds(str(BUILDS_FILE), BUILDS_FILE.stat().st_mtime)
     except Exception as exc:
         st.error(f"Не удалось разобрать {BUILDS_FILE.name}: {exc}")
         return {}
 
 
-def _render_build_tab(build: Dict[str, Any], art_data: Dict[str, Dict[str, Dict[str, float]]]) -> None:
+@st.cache_data(show_spinner=False, max_entries=256)
+def _build_view(encoded: str, mtime: float) -> tuple[pd.DataFrame, str]:
+    """Таблица состава и HTML метрик билда; кэш по строке билда и версии файла данных."""
+    rows = rows_from_encoded(encoded)
+    return rows_to_df(rows), metrics_html_for_build(rows)
+
+
+def _render_build_tab(build: Dict[str, Any]) -> None:
     """
     Отрисовка одной вкладки витрины.
     """
     try:
-        df: pd.DataFrame = df_from_encoded_build(build["encoded"])
+        df, metrics_html = _build_view(build["encoded"], DEFAULT_DATA_FILE.stat().st_mtime)
     except Exception as exc:
         st.error(f"❌ Не удалось декодировать билд {build.get('id', 'WTF???')}: {exc}")
         return
@@ -64,9 +76,7 @@ def _render_build_tab(build: Dict[str, Any], art_data: Dict[str, Dict[str, Dict[
         )
 
     with right_col:
-        summary = calc_summary_df(df, art_data)
-        df_metrics = assemble_metrics_df(summary, df, art_data)
-        st.markdown(style_metrics_html(df_metrics), unsafe_allow_html=True)
+        st.markdown(metrics_html, unsafe_allow_html=True)
 
     st.markdown("<div style='height:8px'></div>", unsafe_allow_html=True)
 
@@ -135,8 +145,6 @@ def collection_page() -> None:
     tab_titles = [b.get("id", f"Build {i + 1}") for i, b in enumerate(builds)]
     tabs = st.tabs(tab_titles)
 
-    art_data = load_artifacts()
-
     for tab, build in zip(tabs, builds):
         with tab:
-            _render_build_tab(build, art_data)
+            _render_build_tab(build)
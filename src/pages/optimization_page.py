@@ -1,6 +1,4 @@
-import json
-import base64
-import math
+import orjson
 import numpy as np
 import pandas as pd
 import streamlit as st
@@ -9,11 +7,67 @@ from pathlib import Path
 import src.utils.helpers as h
 from src.logic.exporter import ExcelExporter
 from src.logic.optimizer import compute_builds
+from src.pages.calculator_page import encoded_from_rows
 from src.utils.spinner_utils import run_with_dynamic_spinner
-from src.utils.constants import preset_map, build_label_alt, build_label_det, ALIASES_DESCR_MAP
+from src.utils.constants import (preset_map,
+                                 build_label_alt,
+                                 build_label_det,
+                                 ALIASES_DESCR_MAP,
+                                 DEFAULT_DATA_FILE,
+                                 PROPS_DIR
+                                 )
+
+
+FIXED_VALUE_HTML = ('<div style="display:flex;align-items:center;justify-content:center;height:48px;">'
+                    '<strong>{label} {value}</strong></div>')
+FIXED_ROW_HTML = '<div style="display:flex;justify-content:center;gap:1rem;">{cells}</div>'
+NO_BUILDS_MSG = ("О-о-о, какое разочарование! Подходящих сборок не найдено! "
+                 "Быть может, слегка смягчите требования или проявите чуть больше гибкости в настройках?")
+RESULT_STATE_KEYS = ("best", "alts", "build_map", "choice_labels", "_build_df_cache", "_excel_bytes",
+                     "_share_cache", "show_builds", "show_table")
+
+
+@st.cache_data(show_spinner=False)
+def _load_art_data(path_str: str, mtime: float) -> tuple[dict, tuple[str, ...]]:
+    """
+    Читает JSON с артефактами один раз на версию файла (mtime входит в ключ кэша).
+    Возвращает сами данные и кортеж имён артефактов.
+    """
+    art_data = orjson.loads(Path(path_str).read_bytes())
+    return art_data, tuple(art_data.keys())
+
+
+@st.cache_data(show_spinner=False)
+def _load_props(path_str: str, num_slots: int, mtime: float) -> h.Props:
+    """
+    Кэширует разбор YAML с правилами. st.cache_data отдаёт копию,
+    поэтому правки props в форме не портят закэшированный оригинал.
+    """
+    return h.Props.load(path_str, num_slots)
+
 
+def load_props(props_file: str, num_slots: int) -> h.Props:
+    path = PROPS_DIR / props_file
+    return _load_props(str(path), num_slots, path.stat().st_mtime)
 
-def draw_centered_slider_row(df_result: pd.DataFrame,
+
+def _remove_fixed(idx: int) -> None:
+    """Колбэк ❌: убирает обязательный артефакт до перезапуска скрипта."""
+    st.session_state.fixed_artifacts.pop(idx)
+
+
+def _toggle_flag(key: str) -> None:
+    """Колбэк кнопок-переключателей (показ билда, легенда)."""
+    st.session_state[key] = not st.session_state.get(key, False)
+
+
+def _reset_results() -> None:
+    """Колбэк «Сброс»: забывает результаты подбора и все производные кэши."""
+    for k in RESULT_STATE_KEYS:
+        st.session_state.pop(k, None)
+
+
+def draw_centered_slider_row(bounds_map: dict[str, tuple[int, int]],
                              prop_list: list[str],
                              filter_vals: dict[str, float],
                              props: h.Props,
@@ -23,26 +77,28 @@ def draw_centered_slider_row(df_result: pd.DataFrame,
     """
     Рисует строку из слайдеров для фильтрации по выбранным свойствам.
     Если минимум и максимум совпадают — вместо слайдера показывается фиксированное значение.
+    Границы (floor от min/max по результатам) считаются один раз в display_results.
     """
+    bounds = [(prop, *bounds_map[prop]) for prop in prop_list]
+
+    # Весь ряд без слайдеров — один markdown вместо колонки на каждое свойство
+    if all(lo == hi for _, lo, hi in bounds):
+        cells = "".join(FIXED_VALUE_HTML.format(label=f"{props.rus(prop)} ≥", value=lo)
+                        for prop, lo, _ in bounds)
+        st.markdown(FIXED_ROW_HTML.format(cells=cells), unsafe_allow_html=True)
+        filter_vals.update({prop: lo for prop, lo, _ in bounds})
+        return
+
     cols = st.columns(7, gap="small")
     n = len(prop_list)
     left_pad = (7 - n) // 2
 
-    for i, prop in enumerate(prop_list):
+    for i, (prop, lo, hi) in enumerate(bounds):
         col = cols[left_pad + i]
-        lo = math.floor(float(df_result[prop].min()))
-        hi = math.floor(float(df_result[prop].max()))
         label = f"{props.rus(prop)} ≥"
 
         if lo == hi:
-            col.markdown(
-                f"""
-                    <div style="display:flex;align-items:center;justify-content:center;height:48px;">
-                      <strong>{label} {lo}</strong>
-                    </div>
-                    """,
-                unsafe_allow_html=True,
-            )
+            col.markdown(FIXED_VALUE_HTML.format(label=label, value=lo), unsafe_allow_html=True)
             filter_vals[prop] = lo
         else:
             filter_vals[prop] = col.slider(
@@ -63,42 +119,51 @@ def display_results(best: dict, alts: list[dict], props: h.Props) -> None:
     а все расчёты ведутся по английским ключам.
     """
     if not best["build"]:
-        st.error("О-о-о, какое разочарование! Подходящих сборок не найдено! "
-                 "Быть может, слегка смягчите требования или проявите чуть больше гибкости в настройках?")
+        st.error(NO_BUILDS_MSG)
         return
 
-    props_order = [k for k in props.data.keys() if k != "slots"]
+    props_order = props.order
 
-    rows: list[dict] = []
+    # Статы — готовая матрица: лучшая сборка первой строкой, затем альтернативы
+    best_stats = best.get("stats", {})
+    stat_mat = np.zeros((len(alts) + 1, len(props_order)), dtype=np.float64)
+    stat_mat[0] = [best_stats.get(k, 0.0) for k in props_order]
+    for i, a in enumerate(alts, 1):
+        stat_mat[i] = [a.get(k, 0.0) for k in props_order]
 
-    det = {"Type": build_label_det, "Run": None, "Score": best.get("score", 0.0)}
-    det.update({k: best.get("stats", {}).get(k, 0.0) for k in props_order})
-    rows.append(det)
+    df_all = pd.DataFrame(stat_mat, columns=props_order)
+    df_all.insert(0, "Type", [build_label_det, *(f"{build_label_alt} {a.get('run', '')}" for a in alts)])
+    df_all.insert(1, "Run", [None, *(a.get("run") for a in alts)])
+    df_all.insert(2, "Score", [best.get("score", 0.0), *(a.get("score", 0.0) for a in alts)])
+    mask_nonzero = stat_mat.any(axis=1)
+    df_result = df_all[mask_nonzero]
 
-    for a in alts:
-        row = {
-            "Type": f"{build_label_alt} {a.get('run', '')}",
-            "Run": a.get("run"),
-            "Score": a.get("score", 0.0),
-            **{k: a.get(k, 0.0) for k in props_order},
-        }
-        rows.append(row)
+    if df_result.empty:
+        st.error(NO_BUILDS_MSG)
+        return
 
-    df_all = pd.DataFrame(rows)
-    mask_nonzero = ~(df_all[props_order] == 0).all(axis=1)
-    df_result = df_all[mask_nonzero]
+    # Слайдеры целочисленные, а для целого t: x >= t ⇔ floor(x) >= t.
+    # Поэтому и границы, и фильтр считаются по компактной int16-матрице
+    res_mat = np.floor(stat_mat[mask_nonzero]).astype(np.int16)
+    lo_all = res_mat.min(axis=0).tolist()
+    hi_all = res_mat.max(axis=0).tolist()
+    bounds_map = dict(zip(props_order, zip(lo_all, hi_all)))
 
-    rus_order = [props.rus(k) for k in props_order]
+    rus_order = props.rus_order
     filter_vals: dict[str, float] = {}
 
-    with st.expander("🔍 Параметры фильтрации", expanded=False):
-        draw_centered_slider_row(df_result, props_order[:7], filter_vals, props, prefix_key="row1")
+    # Слайдеры внутри формы: перетаскивание не перезапускает страницу, фильтр применяется по кнопке
+    with st.expander("🔍 Параметры фильтрации", expanded=False), st.form("result_filters", border=False):
+        draw_centered_slider_row(bounds_map, props_order[:7], filter_vals, props, prefix_key="row1")
 
         if len(props_order) > 7:
-            draw_centered_slider_row(df_result, props_order[7:], filter_vals, props, prefix_key="row2")
+            draw_centered_slider_row(bounds_map, props_order[7:], filter_vals, props, prefix_key="row2")
+
+        st.form_submit_button("✅ Применить фильтры")
 
     if filter_vals:
-        mask = np.logical_and.reduce([df_result[k] >= v for k, v in filter_vals.items()])
+        thresh = np.fromiter((filter_vals[k] for k in props_order), dtype=np.int16, count=len(props_order))
+        mask = (res_mat >= thresh).all(axis=1)
         df_filtered = df_result[mask]
     else:
         df_filtered = df_result
@@ -109,10 +174,12 @@ def display_results(best: dict, alts: list[dict], props: h.Props) -> None:
         return
 
     df_filtered_show = df_filtered.rename(columns=props.display).drop(columns=["Score", "Run"], errors="ignore")
+
+    # Целые числа форматирует фронтенд, Styler нужен только для градиента
     st.dataframe(
-        df_filtered_show.style
-        .format("{:.0f}", subset=df_filtered_show.columns.drop("Type"))
-        .background_gradient(cmap="RdYlGn", subset=rus_order),
+        df_filtered_show.style.background_gradient(cmap="RdYlGn", subset=rus_order),
+        column_config={c: st.column_config.NumberColumn(format="%.0f")
+                       for c in df_filtered_show.columns.drop("Type")},
         use_container_width=True,
         height=min((len(df_filtered_show) + 1) * 35 + 5, 800),
     )
@@ -126,12 +193,13 @@ def optimization_page() -> None:
                        index=0,
                        key="rank_preset",
                        help="Определяет основные параметры и приоритеты свойств. Лакей шепчет: пробуй, экспериментируй, а вдруг найдёшь нечто удивительное.")
-    data_path = Path("data/artifacts_data.json")
-    all_artifacts = []
+    data_path = DEFAULT_DATA_FILE
+    art_data: dict = {}
+    all_artifacts: list[str] = []
 
     if data_path.exists():
-        art_data = json.loads(data_path.read_text(encoding="utf-8"))
-        all_artifacts = list(art_data.keys())
+        art_data, names = _load_art_data(str(data_path), data_path.stat().st_mtime)
+        all_artifacts = list(names)
 
     if sel in preset_map:
         cfg = preset_map[sel]
@@ -141,11 +209,6 @@ def optimization_page() -> None:
         settings.max_copy = cfg["max_copy"]
         settings.props_file = cfg["props_file"]
 
-    all_rows = []
-    for name in all_artifacts:
-        for tier in (1, 2, 3, 4):
-            all_rows.append({"Артефакт": name, "Тир": tier, "Количество": 0})
-
     if "fixed_artifacts" not in st.session_state:
         st.session_state.fixed_artifacts = []
 
@@ -166,9 +229,7 @@ def optimization_page() -> None:
                 line = st.columns([5, 1, 1])
                 line[0].markdown(f"- **{name}**")
                 line[1].markdown(f"Тир {tier}")
-                if line[2].button("❌", key=f"remove_fixed_{idx}"):
-                    st.session_state.fixed_artifacts.pop(idx)
-                    st.rerun()
+                line[2].button("❌", key=f"remove_fixed_{idx}", on_click=_remove_fixed, args=(idx,))
 
     with st.form("opt_form", clear_on_submit=False):
         st.subheader("⚙️ Основные параметры")
@@ -195,10 +256,7 @@ def optimization_page() -> None:
             settings.blacklist = selected_blacklist
 
         with st.expander("🔧 Расширенные настройки свойств", expanded=False):
-            props = h.Props.load(
-                f"props/{settings.props_file}",
-                settings.num_slots
-            )
+            props = load_props(settings.props_file, settings.num_slots)
             x1, x2 = st.columns(2, gap="large")
             with x1:
                 settings.alt_cnt = st.number_input(
@@ -272,12 +330,20 @@ def optimization_page() -> None:
 
         st.session_state["best"] = best
         st.session_state["alts"] = alts
+        st.session_state["build_map"] = {
+            f"{build_label_det}": best.get("build", {}),
+            **{f"{build_label_alt} {a['run']}": a.get("build", {}) for a in alts}
+        }
+        st.session_state["choice_labels"] = list(st.session_state["build_map"])
+        st.session_state.pop("_build_df_cache", None)
+        st.session_state.pop("_excel_bytes", None)
+        st.session_state.pop("_share_cache", None)
         st.session_state["show_builds"] = True
 
     if st.session_state.get("show_builds"):
         best = st.session_state["best"]
         alts = st.session_state["alts"]
-        props_final = h.Props.load(f"props/{settings.props_file}", settings.num_slots)
+        props_final = load_props(settings.props_file, settings.num_slots)
 
         display_results(best, alts, props_final)
         legend_container = st.empty()
@@ -285,39 +351,29 @@ def optimization_page() -> None:
 
         choice = btn_cols[0].selectbox(
             "Билд",
-            [build_label_det] + [f"{build_label_alt} {a['run']}" for a in alts],
+            st.session_state["choice_labels"],
             key="result_build_choice",
             label_visibility="collapsed"
         )
 
-        if btn_cols[1].button("👁️ Показать билд",
-                              key="toggle_build_button",
-                              help="Показать или скрыть состав выбранной сборки",
-                              use_container_width=True):
-            st.session_state["show_table"] = not st.session_state.get("show_table", False)
-            st.rerun()
-
-        build_map = {
-            f"{build_label_det}": best.get("build", {}),
-            **{f"{build_label_alt} {a['run']}": a.get("build", {}) for a in alts}
-        }
-        build = build_map[choice]
-        build_list = [
-            {
-                "name": name,
-                "tier": int(tier),
-                "count": int(cnt)
-            }
-            for name, tier, cnt in build
-        ]
-        raw = json.dumps(build_list, ensure_ascii=False)
-        encoded = base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+        btn_cols[1].button("👁️ Показать билд",
+                           key="toggle_build_button",
+                           help="Показать или скрыть состав выбранной сборки",
+                           use_container_width=True,
+                           on_click=_toggle_flag,
+                           args=("show_table",))
+
+        build = st.session_state["build_map"][choice]
+        share_cache = st.session_state.setdefault("_share_cache", {})
+        if choice not in share_cache:
+            share_cache[choice] = (
+                encoded_from_rows([(name, int(tier), int(cnt)) for name, tier, cnt in build]),
+                "\n".join(f"{i + 1}. {name} (Тир {tier}) — {cnt} шт."
+                          for i, (name, tier, cnt) in enumerate(build)),
+            )
+        encoded, txt = share_cache[choice]
         share_href = f"/?build={encoded}"
 
-        txt = "\n".join(
-            f"{i + 1}. {name} (Тир {tier}) — {cnt} шт."
-            for i, (name, tier, cnt) in enumerate(build)
-        )
         btn_cols[2].download_button(
             "📝️ Сохранить в TXT",
             txt,
@@ -335,8 +391,12 @@ def optimization_page() -> None:
             help="Перейти в калькулятор с выбранной сборкой — чтобы рассмотреть всё в деталях"
         )
 
-        exporter = ExcelExporter(settings, list(props_final.data.keys()))
-        excel_bytes = exporter.build_bytes(best, alts)
+        stat_keys = tuple(props_final.data.keys())
+        cached_excel = st.session_state.get("_excel_bytes")
+        if cached_excel is None or cached_excel[0] != stat_keys:
+            cached_excel = (stat_keys, ExcelExporter(settings, list(stat_keys)).build_bytes(best, alts))
+            st.session_state["_excel_bytes"] = cached_excel
+        excel_bytes = cached_excel[1]
         btn_cols[4].download_button(
             "📊️ Сохранить в Excel",
             excel_bytes,
@@ -346,21 +406,22 @@ def optimization_page() -> None:
             use_container_width=True
         )
 
-        if btn_cols[5].button("♻️️ Сброс",
-                              key="reset_button",
-                              help="Очистить все сборки и начать с чистого КПК",
-                              use_container_width=True):
-            for k in ("best", "alts", "show_builds", "show_table"):
-                st.session_state.pop(k, None)
-            st.rerun()
+        btn_cols[5].button("♻️️ Сброс",
+                           key="reset_button",
+                           help="Очистить все сборки и начать с чистого КПК",
+                           use_container_width=True,
+                           on_click=_reset_results)
 
         if st.session_state.get("show_table", False):
             tabs = st.tabs(["📋 Таблица", "📝 Текст"])
             with tabs[0]:
-                df_build = pd.DataFrame(
-                    build,
-                    columns=["Артефакт", "Тир", "Количество"]
-                )
+                build_df_cache = st.session_state.setdefault("_build_df_cache", {})
+                if choice not in build_df_cache:
+                    build_df_cache[choice] = pd.DataFrame(
+                        build,
+                        columns=["Артефакт", "Тир", "Количество"]
+                    )
+                df_build = build_df_cache[choice]
                 st.dataframe(df_build, hide_index=True, height=h.calculate_table_height(df_build))
 
             with tabs[1]:
@@ -370,33 +431,31 @@ def optimization_page() -> None:
                 st.code(txt_pretty, language="markdown")
 
             with st.expander("🔍 Характеристики артефактов в билде", expanded=False):
-                labels = []
+                # Один проход по билду: ненулевые свойства каждого артефакта
+                entries = []
                 for name, tier, count in build:
-                    stats = art_data[name][str(tier)]
-                    if any(v != 0 for v in stats.values()):
-                        labels.append(f"{name} T{tier}")
-
-                if labels:
-                    tabs = st.tabs(labels)
-                    for (name, tier, count), tab in zip(
-                            [(n, t, c) for n, t, c in build if f"{n} T{t}" in labels],
-                            tabs):
-                        stats = art_data[name][str(tier)]
-                        filtered = {k: v for k, v in stats.items() if v != 0}
+                    filtered = {k: v for k, v in art_data[name][str(tier)].items() if v}
+                    if filtered:
+                        entries.append((f"{name} T{tier}", count, filtered))
+
+                if entries:
+                    tabs = st.tabs([label for label, _, _ in entries])
+                    for (_, count, filtered), tab in zip(entries, tabs):
+                        per_one = np.fromiter(filtered.values(), dtype=np.float64, count=len(filtered))
                         with tab:
                             df_stats = pd.DataFrame({
-                                "Свойство": list(filtered.keys()),
-                                "1 шт": [round(v, 2) for v in filtered.values()],
-                                f"{count} шт": [round(v * count, 2) for v in filtered.values()],
+                                "Свойство": list(filtered),
+                                "1 шт": per_one.round(2),
+                                f"{count} шт": (per_one * count).round(2),
                             })
                             st.dataframe(df_stats, use_container_width=True, hide_index=True)
 
-        if btn_cols[6].button("ℹ️",
-                              key="legend_btn",
-                              help="Показать или скрыть легенду: что означают свойства в таблице",
-                              use_container_width=True):
-            st.session_state.show_legend = not st.session_state.get("show_legend", False)
-            st.rerun()
+        btn_cols[6].button("ℹ️",
+                           key="legend_btn",
+                           help="Показать или скрыть легенду: что означают свойства в таблице",
+                           use_container_width=True,
+                           on_click=_toggle_flag,
+                           args=("show_legend",))
 
         if st.session_state.get("show_legend", False):
             items_html = "".join(
@@ -1,17 +1,19 @@
 import streamlit as st
+from functools import lru_cache
 
 from src.utils.helpers import get_base64_image
 
 
-def render_header() -> None:
+@lru_cache(maxsize=1)
+def _header_html() -> str:
+    """Шапка статична: картинки кодируются и HTML собирается один раз на процесс."""
     bg_img = get_base64_image("assets/bg.jpg")
     bubl_img = get_base64_image("assets/bubl.png")
     flame_img = get_base64_image("assets/flame.png")
     crys_img = get_base64_image("assets/crys.png")
     jelly_img = get_base64_image("assets/jelly.png")
 
-    st.markdown(
-        f"""<div class="custom-header" style="
+    return f"""<div class="custom-header" style="
             background-image: url('data:image/png;base64,{bg_img}');
             background-size: cover;
             background-position: center;
@@ -32,6 +34,8 @@ def render_header() -> None:
         <div class="pulse-brown artifact-icon"><img src="data:image/png;base64,{jelly_img}"/></div>
       </div>
     </div>
-    </div>""",
-        unsafe_allow_html=True,
-    )
+    </div>"""
+
+
+def render_header() -> None:
+    st.markdown(_header_html(), unsafe_allow_html=True)
@@ -14,22 +14,16 @@ def generate_achievable_hash(tier: int,
                              props_file: str
                              ) -> str:
     """
-    Строит SHA-256 хеш ограничений для поиска в кэше:
-    tier, number of slots, max_copy, blacklist, props_file и props (name, low, high).
+    Строит BLAKE2b-хеш (16 байт) ограничений для поиска в кэше:
+    tier, number of slots, max_copy, blacklist, props_file и props (name, use, low, high).
+    Поля подаются в хеш по очереди в каноническом порядке, без промежуточного JSON.
     """
-    payload = {
-        'tier': tier,
-        'slots': slots,
-        'max_copy': max_copy,
-        'blacklist': blacklist,
-        'props_file': props_file,
-        'props': [
-            {'name': name, 'low': meta.get('low'), 'high': meta.get('high')}
-            for name, meta in sorted(props_data.items(), key=lambda x: x[0])
-        ]
-    }
-    serialized = json.dumps(payload, ensure_ascii=False, sort_keys=True)
-    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+    digest = hashlib.blake2b(f"{tier}|{slots}|{max_copy}|{props_file}|".encode('utf-8'), digest_size=16)
+    digest.update("\x1f".join(sorted(blacklist)).encode('utf-8'))
+    for name in sorted(props_data):
+        meta = props_data[name]
+        digest.update(f"|{name}:{bool(meta.get('use'))}:{meta.get('low')}:{meta.get('high')}".encode('utf-8'))
+    return digest.hexdigest()
 
 
 def load_session_achievable(hash_key: str) -> Optional[Dict[str, Dict[str, float]]]:
@@ -469,3 +469,10 @@ footer_phrases = [
     "🐘 Слон пытался запомнить все свойства. Интерфейс попросил перерыв",
     "🐊 Крокодил ничего не трогал. Просто сидел и наблюдал. Очень внимательно",
 ]
+
+FOOTER_TEMPLATE = """
+    <hr class="site-footer-hr">
+    <div class="site-footer">
+      {phrase} — <b>hailSolus</b>
+    </div>
+    """
@@ -1,16 +1,19 @@
-import re
-import yaml
 import base64
 import random
+import numpy as np
 import pandas as pd
-import streamlit as st
 from collections import Counter
+from functools import cached_property, lru_cache
 from dataclasses import dataclass, field
 from typing import List, Dict, Any, Tuple
 
 from src.utils.constants import footer_phrases, DEFAULT_DATA_FILE
 
 
+# Неизменяемый образец; каждому Settings достаётся своя изменяемая копия списка
+_DEFAULT_BLACKLIST = ("Душа", "Пустышка")
+
+
 @dataclass
 class Settings:
     """
@@ -20,7 +23,7 @@ class Settings:
     tier: int = 3
     num_slots: int = 17
     max_copy: int = 3
-    blacklist: List[str] = field(default_factory=lambda: ["Душа", "Пустышка"])
+    blacklist: List[str] = field(default_factory=lambda: list(_DEFAULT_BLACKLIST))
     jitter: float = 0.0
     alt_jitter: float = 0.30
     alt_cnt: int = 10
@@ -55,19 +58,10 @@ class Props:
             name: meta.get("rus", meta.get("column", name))
             for name, meta in self.data.items()
         }
-        self.display = {
-            k: meta.get("rus", meta.get("column", k))
-            for k, meta in data.items()
-        }
-
-    def __post_init__(self) -> None:
-        self.display: dict[str, str] = {
-            name: meta.get("rus", meta.get("column", name))
-            for name, meta in self.data.items()
-        }
 
     @classmethod
     def load(cls, path: str, num_slots: int) -> "Props":
+        import yaml  # нужен только странице оптимизатора — калькулятор и коллекция его не грузят
         with open(path, encoding="utf-8") as f:
             props_dict = yaml.safe_load(f)
         props_dict["slots"]["low"] = num_slots
@@ -78,22 +72,40 @@ class Props:
         """Возвращает человеко-понятное (русское) название для системного ключа"""
         return self.display.get(key, key)
 
+    @cached_property
+    def order(self) -> list[str]:
+        """Системные ключи свойств в порядке YAML, без служебного slots"""
+        return [k for k in self.data if k != "slots"]
+
+    @cached_property
+    def rus_order(self) -> list[str]:
+        """Русские названия свойств в том же порядке, что и order"""
+        return [self.display[k] for k in self.order]
+
+    @cached_property
+    def reverse_display(self) -> dict[str, str]:
+        """Обратное отображение: русское название → системный ключ"""
+        return {rus_name: key for key, rus_name in self.display.items()}
+
     def save(self, path: str) -> None:
         """
         Сохраняем актуальные правила обратно в YAML.
         """
+        import yaml
         with open(path, 'w', encoding='utf-8') as f:
             yaml.safe_dump(self.data, f, allow_unicode=True)
 
 
+# Неподходящие разделители чёрного списка → запятая; пустые элементы потом отбрасываются при split
+_BLACKLIST_SEPARATORS = str.maketrans(dict.fromkeys(";/\\|.", ","))
+
+
 def normalize_blacklist_input(raw: str) -> Tuple[List[str], str | None]:
     """
     Обрабатывает строку из текстового поля и возвращает чистый список имён.
     Дополнительно подсказывает, если в разделителях закралась коварная опечатка.
     """
-
-    bad_separator = re.compile(r"[;/\\|.]+")
-    cleaned = bad_separator.sub(",", raw)
+    cleaned = raw.translate(_BLACKLIST_SEPARATORS)
 
     info_msg = (
         "Ах! Неловкость вышла… Ваши символы оказались неподходящими, я поспешил заменить их на запятые! "
@@ -105,6 +117,12 @@ def normalize_blacklist_input(raw: str) -> Tuple[List[str], str | None]:
     return items, info_msg
 
 
+@lru_cache(maxsize=8)
+def _lowercase_names(names: Tuple[str, ...]) -> Dict[str, str]:
+    """Соответствие «имя в нижнем регистре → каноничное имя» для одного каталога."""
+    return {name.lower(): name for name in names}
+
+
 def validate_blacklist(items: List[str],
                        available_names: List[str]
                        ) -> Tuple[List[str], List[str]]:
@@ -112,7 +130,7 @@ def validate_blacklist(items: List[str],
     Делит входной список на (valid, invalid) с учётом регистра.
     Возвращает пары уже в «правильном» регистре из available_names.
     """
-    norm = {name.lower(): name for name in available_names}
+    norm = _lowercase_names(tuple(available_names))
     valid, invalid = [], []
     for item in items:
         match = norm.get(item.lower())
@@ -131,13 +149,13 @@ def validate_adv_props(df: pd.DataFrame) -> List[str]:
         errors.append("Ах! Ни одно свойство не выбрано! "
                       "Прошу, отметьте хотя бы одно в расширенных настройках — иначе мне неловко продолжать!")
 
-    mask = df["Use"] & df["Min enabled"] & df["Max enabled"]
-    for _, row in df[mask].iterrows():
-        if row["Min"] > row["Max"]:
-            errors.append(
-                f"О, скромное замечание! В свойстве «{row['Property']}» "
-                f"нижняя граница ({row['Min']}) не может быть больше верхней ({row['Max']})."
-            )
+    mask = np.logical_and.reduce([df[c].to_numpy(dtype=bool) for c in ("Use", "Min enabled", "Max enabled")])
+    mask &= df["Min"].to_numpy(dtype=float) > df["Max"].to_numpy(dtype=float)
+    for prop, lo, hi in zip(df["Property"][mask], df["Min"][mask], df["Max"][mask]):
+        errors.append(
+            f"О, скромное замечание! В свойстве «{prop}» "
+            f"нижняя граница ({lo}) не может быть больше верхней ({hi})."
+        )
 
     return errors
 
@@ -165,6 +183,8 @@ def validate_fixed_copies(fixed: List[Tuple[str, int]],
     Проверяет, что ни один артефакт не зафиксирован более max_copy раз.
     """
     errors: List[str] = []
+    if len(fixed) <= max_copy:
+        return errors
     counts = Counter(fixed)
     for (name, tier), cnt in counts.items():
         if cnt > max_copy:
@@ -205,22 +225,19 @@ def props_to_df(props: Props) -> pd.DataFrame:
     Преобразует свойства в удобный DataFrame для редактирования.
     Скрытые служебные параметры остаются за кулисами.
     """
-    rows: List[Dict[str, Any]] = []
-    hidden = {"slots"}
+    metas = [props.data[name] for name in props.order]
+    lows = [meta.get("low") for meta in metas]
+    highs = [meta.get("high") for meta in metas]
 
-    for name, meta in props.data.items():
-        if name in hidden:
-            continue
-        rows.append({
-            "Use": bool(meta.get("use", False)),
-            "Property": props.rus(name),
-            "Priority": float(meta.get("priority", 0)),
-            "Min enabled": meta.get("low") is not None,
-            "Min": int(meta.get("low") or 0),
-            "Max enabled": meta.get("high") is not None,
-            "Max": int(meta.get("high") or 0),
-        })
-    return pd.DataFrame(rows)
+    return pd.DataFrame({
+        "Use": np.array([bool(meta.get("use", False)) for meta in metas], dtype=bool),
+        "Property": props.rus_order,
+        "Priority": np.array([meta.get("priority", 0) for meta in metas], dtype=np.float64),
+        "Min enabled": np.array([v is not None for v in lows], dtype=bool),
+        "Min": np.array([int(v or 0) for v in lows], dtype=np.int64),
+        "Max enabled": np.array([v is not None for v in highs], dtype=bool),
+        "Max": np.array([int(v or 0) for v in highs], dtype=np.int64),
+    })
 
 
 def df_to_props(df: pd.DataFrame, props: Props) -> None:
@@ -228,37 +245,32 @@ def df_to_props(df: pd.DataFrame, props: Props) -> None:
     Обновляет свойства из отредактированного DataFrame обратно в props.data.
     Русские подписи колонок сопоставляются с внутренними ключами.
     """
-    reverse_display: dict[str, str] = {
-        rus_name: key for key, rus_name in props.display.items()
-    }
+    reverse_display = props.reverse_display
+    cols = ["Property", "Use", "Priority", "Min enabled", "Min", "Max enabled", "Max"]
 
-    for _, row in df.iterrows():
-        rus_name = row["Property"]
+    for rus_name, use, prio, min_en, min_v, max_en, max_v in df[cols].itertuples(index=False, name=None):
         key = reverse_display.get(rus_name)
         if key is None:
             continue
 
         meta: dict[str, Any] = props.data[key]
-        meta["use"] = bool(row["Use"])
-
-        if not row["Use"]:
-            meta["priority"] = 0
-        else:
-            meta["priority"] = float(row["Priority"])
+        meta["use"] = bool(use)
+        meta["priority"] = float(prio) if use else 0
 
-        if row["Min enabled"]:
-            meta["low"] = float(row["Min"])
+        if min_en:
+            meta["low"] = float(min_v)
         else:
             meta.pop("low", None)
 
-        if row["Max enabled"]:
-            meta["high"] = float(row["Max"])
+        if max_en:
+            meta["high"] = float(max_v)
         else:
             meta.pop("high", None)
 
 
-@st.cache_data(show_spinner=False)
-def get_base64_image(image_path):
+@lru_cache(maxsize=32)
+def get_base64_image(image_path: str) -> str:
+    """Картинки из assets не меняются во время работы — строка кодируется один раз на процесс."""
     with open(image_path, "rb") as img_file:
         return base64.b64encode(img_file.read()).decode()
 
@@ -1,9 +1,15 @@
-import json
-import hashlib
+import orjson
 import os
+import numpy as np
+import pandas as pd
 
 from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from functools import lru_cache
+from typing import Callable
+from pathlib import Path
 
+from src.utils.cache_utils import generate_achievable_hash
 from src.utils.constants import ACHIEVABLE_DIR, PROPS_DIR, preset_map
 from src.utils.helpers import Settings, Props
 from src.logic.data_loader import DataLoader
@@ -25,33 +31,50 @@ def compute_hash(tier: int,
                  props_file: str,
                  props_data: dict,
                  ) -> str:
-    payload = {
-        "tier": tier,
-        "slots": slots,
-        "max_copy": max_copy,
-        "blacklist": blacklist,
-        "props_file": props_file,
-        "props": [
-            {"name": name, "low": meta.get("low"), "high": meta.get("high")}
-            for name, meta in sorted(props_data.items(), key=lambda x: x[0])
-        ],
-    }
-    serialized = json.dumps(payload, ensure_ascii=False, sort_keys=True)
-    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
-
-
-def compute_achievable_extrema(settings: Settings) -> tuple[dict, dict]:
     """
-    Загружаем props, строим DataFrame и вычисляем реальный максимум
-    для каждого «используемого» и приоритетного свойства.
+    Ключ предрасчёта — тот же хеш, по которому приложение ищет максимумы в кэше.
     """
-    props = Props.load(PROPS_DIR / settings.props_file, settings.num_slots)
-    df = DataLoader(settings).load()
+    return generate_achievable_hash(tier, slots, max_copy, blacklist, props_data, props_file)
 
-    calc = CoefficientCalculator(props, df)
-    calc.compute()
 
-    solver = ILPSolver(df, calc.coef, props.data, settings)
+@lru_cache(maxsize=None)
+def _load_props(props_file: str, num_slots: int) -> Props:
+    """YAML правил разбирается один раз на (файл, слоты) в каждом процессе."""
+    return Props.load(PROPS_DIR / props_file, num_slots)
+
+
+def _props_data(props_file: str, slots: int) -> dict:
+    return _load_props(props_file, slots).data
+
+
+@lru_cache(maxsize=None)
+def _load_df(data_file: str) -> pd.DataFrame:
+    """Таблица артефактов читается один раз на процесс, все группы в нём её переиспользуют."""
+    settings = Settings()
+    settings.data_file = data_file
+    return DataLoader(settings).load()
+
+
+def compute_achievable_extrema(settings: Settings,
+                               df: pd.DataFrame | None = None,
+                               coef: dict[str, np.ndarray] | None = None,
+                               solver: ILPSolver | None = None,
+                               ) -> tuple[dict, dict]:
+    """
+    Загружаем props, строим DataFrame и вычисляем реальный максимум
+    для каждого «используемого» и приоритетного свойства.
+    Готовые df и coef можно передать, чтобы не пересчитывать их для каждой комбинации,
+    а готовый solver — чтобы переиспользовать его модель (см. ILPSolver.set_num_slots).
+    """
+    props = _load_props(settings.props_file, settings.num_slots)
+    if solver is None:
+        if df is None:
+            df = _load_df(settings.data_file)
+        if coef is None:
+            calc = CoefficientCalculator(props, df)
+            calc.compute()
+            coef = calc.coef
+        solver = ILPSolver(df, coef, props.data, settings)
 
     maxima: dict[str, float] = {}
     for p, meta in props.data.items():
@@ -66,25 +89,115 @@ def compute_achievable_extrema(settings: Settings) -> tuple[dict, dict]:
     return props.data, maxima
 
 
-def worker(args):
-    tier, slots, max_copy, blacklist, props_file = args
-    settings = Settings()
-    settings.tier = tier
-    settings.num_slots = slots
-    settings.max_copy = max_copy
-    settings.blacklist = blacklist
-    settings.props_file = props_file
-
-    props_data, maxima = compute_achievable_extrema(settings)
-    hsh = compute_hash(tier, slots, max_copy, blacklist, props_file, props_data)
-    key = (
+def combo_key(tier: int, slots: int, max_copy: int, blacklist: list[str], props_file: str) -> str:
+    return (
         f"{props_file.replace('.yaml', '')}_"
         f"tier_{tier}_"
         f"slots_{slots}_"
         f"maxcopy_{max_copy}_"
         f"blacklist_{'_'.join(blacklist)}"
     )
-    return key, {"hash": hsh, "maxima": maxima}
+
+
+def output_paths(props_file: str) -> tuple[Path, Path]:
+    """Итоговый JSON файла правил и его промежуточный NDJSON."""
+    stem = props_file.replace('.yaml', '')
+    return ACHIEVABLE_DIR / f"achievable_{stem}.json", ACHIEVABLE_DIR / f"achievable_{stem}.ndjson"
+
+
+def read_ndjson(path: Path) -> dict[str, dict]:
+    entries: dict[str, dict] = {}
+    with path.open("rb") as f:
+        for line in f:
+            if line.strip():
+                record = orjson.loads(line)
+                entries[record.pop("key")] = record
+    return entries
+
+
+def load_previous_results() -> dict[str, dict]:
+    """
+    Читает ранее сохранённые achievable_*.json — они служат кэшем между запусками.
+    NDJSON, оставшийся от прерванного прогона, тоже учитывается: сделанное не пересчитывается.
+    """
+    previous: dict[str, dict] = {}
+    for path in ACHIEVABLE_DIR.glob("achievable_*.json"):
+        previous.update(orjson.loads(path.read_bytes()))
+    for path in ACHIEVABLE_DIR.glob("achievable_*.ndjson"):
+        previous.update(read_ndjson(path))
+    return previous
+
+
+def make_settings(tier: int, slots: int, max_copy: int, blacklist: list[str], props_file: str) -> Settings:
+    settings = Settings()
+    settings.tier = tier
+    settings.num_slots = slots
+    settings.max_copy = max_copy
+    settings.blacklist = list(blacklist)
+    settings.props_file = props_file
+    return settings
+
+
+def worker(batch):
+    """
+    Считает все (slots, max_copy) одной группы (tier, props_file, blacklist).
+    Таблица артефактов и коэффициенты от слотов и копий не зависят — строятся один раз на группу.
+    """
+    tier, props_file, blacklist, grid = batch
+    df = _load_df(Settings().data_file)
+    calc = CoefficientCalculator(_load_props(props_file, grid[0][0]), df)
+    calc.compute()
+
+    # Для каждого max_copy слоты идут по возрастанию через одну модель:
+    # меняется только правая часть ограничения на слоты, модель не перестраивается
+    out = []
+    solvers: dict[int, ILPSolver] = {}
+    for slots, max_copy in sorted(grid, key=lambda sc: (sc[1], sc[0])):
+        settings = make_settings(tier, slots, max_copy, blacklist, props_file)
+        solver = solvers.get(max_copy)
+        if solver is None:
+            solver = solvers[max_copy] = ILPSolver(df, calc.coef, _props_data(props_file, slots), settings)
+        else:
+            solver.set_num_slots(slots)
+        props_data, maxima = compute_achievable_extrema(settings, solver=solver)
+        hsh = compute_hash(tier, slots, max_copy, list(blacklist), props_file, props_data)
+        out.append((combo_key(tier, slots, max_copy, list(blacklist), props_file),
+                    {"hash": hsh, "maxima": maxima}))
+    return out
+
+
+def run_pending(pending: list[tuple], data_mtime: int, emit: Callable[[str, str, dict], None]) -> None:
+    """
+    Считает недостающие комбинации в пуле процессов и отдаёт каждую запись в emit по мере готовности.
+    """
+    # Группы (tier, props_file, blacklist): внутри группы общий df и коэффициенты
+    groups: dict[tuple, list[tuple[int, int]]] = {}
+    for tier, slots, max_copy, blacklist, props_file in pending:
+        groups.setdefault((tier, props_file, tuple(blacklist)), []).append((slots, max_copy))
+    total = len(groups)
+
+    workers = os.cpu_count() or 16
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for idx, ((tier, props_file, blacklist), grid) in enumerate(groups.items(), start=1):
+            print(f"[SUBMIT] {idx}/{total} → tier={tier}, props={props_file}, bl={list(blacklist)}, combos={len(grid)}")
+            fut = executor.submit(worker, (tier, props_file, blacklist, grid))
+            futures[fut] = (tier, props_file, blacklist)
+
+        print("[INFO] All tasks submitted, awaiting results...")
+
+        done = 0
+        for fut in as_completed(futures):
+            done += 1
+            tier, props_file, blacklist = futures[fut]
+            try:
+                for key, res in fut.result():
+                    res["data_mtime"] = data_mtime
+                    emit(props_file, key, res)
+                print(f"[DONE] {done}/{total} → tier={tier}, props={props_file}, bl={list(blacklist)}")
+            except Exception as e:
+                print(f"[ERROR] Group tier={tier}, props={props_file}, bl={list(blacklist)} failed: {e}")
 
 
 def main() -> None:
@@ -98,40 +211,45 @@ def main() -> None:
         for mc in range(MAX_COPY_MIN, MAX_COPY_MAX + 1)
         for bl in BLACKLISTS
     ]
-    total = len(combos)
 
-    results: dict[str, dict] = {}
-    workers = os.cpu_count() or 16
+    # Комбинации, у которых не изменились ни правила (hash), ни файл данных, берутся из прошлых результатов
+    data_mtime = Path(Settings().data_file).stat().st_mtime_ns
+    previous = load_previous_results()
 
-    with ProcessPoolExecutor(max_workers=workers) as executor:
-        futures = {}
-        for idx, args in enumerate(combos, start=1):
+    # Результаты не копятся в памяти: каждая запись сразу дописывается в NDJSON своего файла правил,
+    # итоговые JSON собираются из них в конце по одному файлу за раз
+    props_files = list(dict.fromkeys(cfg["props_file"] for cfg in preset_map.values()))
+    with ExitStack() as stack:
+        sinks = {pf: stack.enter_context(output_paths(pf)[1].open("wb")) for pf in props_files}
+
+        def emit(props_file: str, key: str, payload: dict) -> None:
+            sink = sinks[props_file]
+            sink.write(orjson.dumps({"key": key, **payload}, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n")
+            sink.flush()
+
+        pending = []
+        for args in combos:
             tier, slots, max_copy, blacklist, props_file = args
-            print(f"[SUBMIT] {idx}/{total} → tier={tier}, slots={slots}, max_copy={max_copy}, bl={blacklist}")
-            fut = executor.submit(worker, args)
-            futures[fut] = args
+            key = combo_key(*args)
+            prev = previous.get(key)
+            if (prev is not None
+                    and prev.get("data_mtime") == data_mtime
+                    and prev.get("hash") == compute_hash(tier, slots, max_copy, blacklist, props_file,
+                                                         _props_data(props_file, slots))):
+                emit(props_file, key, prev)
+            else:
+                pending.append(args)
+        del previous
 
-        print("[INFO] All tasks submitted, awaiting results...")
+        print(f"[INFO] Reused {len(combos) - len(pending)} cached combos, {len(pending)} to compute")
+        run_pending(pending, data_mtime, emit)
 
-        done = 0
-        for fut in as_completed(futures):
-            done += 1
-            tier, slots, max_copy, blacklist, props_file = futures[fut]
-            try:
-                key, res = fut.result()
-                results[key] = res
-                print(f"[DONE] {done}/{total} → key={key}, hash={res['hash']}")
-            except Exception as e:
-                print(f"[ERROR] Task tier={tier}, slots={slots}, max_copy={max_copy}, bl={blacklist} failed: {e}")
-
-    for preset_name, preset_cfg in preset_map.items():
-        props_file = preset_cfg["props_file"]
-        stem = props_file.replace(".yaml", "")
-        out_file = ACHIEVABLE_DIR / f"achievable_{props_file.replace('.yaml', '')}.json"
-        filtered = {k: v for k, v in results.items() if stem in k}
-        print(f"[WRITE] preset={preset_name}, props_file={props_file}, entries={len(filtered)} → {out_file.name}")
-        with out_file.open("w", encoding="utf-8") as f:
-            json.dump(filtered, f, ensure_ascii=False, indent=2)
+    for props_file in props_files:
+        out_file, ndjson_file = output_paths(props_file)
+        entries = read_ndjson(ndjson_file)
+        print(f"[WRITE] props_file={props_file}, entries={len(entries)} → {out_file.name}")
+        out_file.write_bytes(orjson.dumps(entries, option=orjson.OPT_INDENT_2))
+        ndjson_file.unlink()
         print(f"[FILE]  Saved {out_file.resolve()}")
 
 
@@ -1,5 +1,5 @@
-import time
 import threading
+from functools import lru_cache
 import streamlit as st
 import streamlit.components.v1 as components
 from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
@@ -8,7 +8,9 @@ from src.utils.helpers import get_base64_image
 from src.utils.constants import spinner_phrases
 
 
-def get_spinner_html(phrases: list[str]) -> str:
+@lru_cache(maxsize=4)
+def get_spinner_html(phrases: tuple[str, ...]) -> str:
+    """HTML спиннера собирается один раз на набор фраз (картинка уже закэширована в get_base64_image)."""
     spinner_img = get_base64_image("assets/spinner.png")
 
     return f"""
@@ -63,7 +65,7 @@ def get_spinner_html(phrases: list[str]) -> str:
     </style>
 
     <script>
-      const phrases = {phrases};
+      const phrases = {list(phrases)};
       const phraseEl = document.getElementById('phrase');
       let lastIndex = -1;
     
@@ -88,25 +90,28 @@ def run_with_dynamic_spinner(task_fn, *args, **kwargs):
 
     with placeholder:
         components.html(
-            get_spinner_html(spinner_phrases),
+            get_spinner_html(tuple(spinner_phrases)),
             height=120,
             scrolling=False
         )
 
     result = None
-    done = False
+    error: BaseException | None = None
 
     def task_wrapper():
-        nonlocal result, done
-        result = task_fn(*args, **kwargs)
-        done = True
+        nonlocal result, error
+        try:
+            result = task_fn(*args, **kwargs)
+        except BaseException as e:
+            error = e
 
+    # Фразы крутит JS внутри iframe — Python просто ждёт завершения задачи, без опроса
     thread = threading.Thread(target=task_wrapper)
     add_script_run_ctx(thread, get_script_run_ctx())
     thread.start()
-
-    while not done:
-        time.sleep(3.5)
+    thread.join()
 
     placeholder.empty()
+    if error is not None:
+        raise error
     return result
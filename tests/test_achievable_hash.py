@@ -0,0 +1,21 @@
+from src.utils.cache_utils import generate_achievable_hash
+from src.utils.precompute_achievable import compute_hash
+
+PROPS = {
+    "stamina": {"use": True, "low": 0, "high": 50},
+    "slots": {"use": True, "low": 17, "high": 17},
+    "radiation": {"use": False, "low": None, "high": 0},
+}
+
+
+def test_precompute_hash_matches_app_lookup():
+    blacklist = ["Пустышка", "Душа"]
+    # Приложение передаёт отсортированный чёрный список, скрипт предрасчёта — как есть
+    app_key = generate_achievable_hash(3, 17, 3, sorted(blacklist), PROPS, "props_tier3.yaml")
+    assert compute_hash(3, 17, 3, blacklist, "props_tier3.yaml", PROPS) == app_key
+
+
+def test_hash_depends_on_use_flag():
+    toggled = {**PROPS, "radiation": {**PROPS["radiation"], "use": True}}
+    assert (compute_hash(3, 17, 3, ["Душа"], "props_tier3.yaml", PROPS)
+            != compute_hash(3, 17, 3, ["Душа"], "props_tier3.yaml", toggled))
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from src.logic.optimizer import ILPSolver
+from src.utils.helpers import Settings
+
+
+class _FakeVar:
+    def __init__(self, value: float) -> None:
+        self._value = value
+
+    def value(self) -> float:
+        return self._value
+
+
+def _solver(num_slots: int) -> ILPSolver:
+    df = pd.DataFrame({"Имя": ["А", "Б", "В", "Г"], "Тир": [3, 3, 3, 3]})
+    coef = {
+        "slots": np.ones(4),
+        "stamina": np.array([1.0, 2.0, 3.0, 4.0]),
+    }
+    props = {
+        "slots": {"use": True, "expr": 1, "low": num_slots, "high": num_slots, "priority": 0},
+        "stamina": {"use": True, "column": "Выносливость", "low": 0, "high": 50, "priority": 1},
+    }
+    settings = Settings()
+    settings.num_slots = num_slots
+    return ILPSolver(df, coef, props, settings)
+
+
+def test_extract_solution_rounds_near_integer_highs_values():
+    solver = _solver(17)
+    # Так HiGHS возвращает решение на 17 слотов: 3 - 4e-15, 14 и остаток 3.6e-15
+    x = {0: _FakeVar(2.999999999999996), 1: _FakeVar(14.0), 2: _FakeVar(3.6e-15), 3: _FakeVar(None)}
+
+    build, stats = solver._extract_solution(x)
+
+    counts = [cnt for _, _, cnt in build]
+    assert sum(counts) == 17
+    assert 0 not in counts
+    assert build == [("А", 3, 3), ("Б", 3, 14)]
+    assert stats["slots"] == 17.0
+    assert stats["stamina"] == 3 * 1.0 + 14 * 2.0